@@ -0,0 +1,123 @@
+import os
+import time
+import struct
+import threading
+import pygame
+
+CLIENT_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(CLIENT_DIR, "assets")
+# Per-user, outside the source tree
+DISK_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache")),
+                              "number_guess_game", "assets")
+# width, height, seconds the decode and scale took when the entry was written
+CACHE_HEADER = struct.Struct("<HHd")
+
+class AssetManager:
+    """Loads images on first use and caches every scaled variant.
+
+    ``preload`` starts decoding and scaling in a background thread so that a
+    later ``get_image`` only has to convert the surface for the display;
+    ``get_image`` never waits for it and returns None until it is done.
+    When ``use_disk_cache`` is set, scaled variants are also written to
+    ``DISK_CACHE_DIR`` as raw RGBA and reused on the next start, as long as
+    reading them is faster than the decode they replace.
+    """
+
+    def __init__(self, use_disk_cache=False):
+        self.use_disk_cache = use_disk_cache
+        self.images = {}
+        self.loaded = {}
+        self.pending = {}
+        self.failed = set()
+        self.lock = threading.Lock()
+
+    def preload(self, name, size):
+        key = (name, tuple(size))
+        with self.lock:
+            if key in self.images or key in self.loaded or key in self.pending or key in self.failed:
+                return
+            self.pending[key] = threading.Event()
+        threading.Thread(target=self._preload_thread, args=(key,), daemon=True).start()
+
+    def _preload_thread(self, key):
+        surface = self._load(*key)
+        with self.lock:
+            if surface is None:
+                self.failed.add(key)
+            else:
+                self.loaded[key] = surface
+            self.pending.pop(key).set()
+
+    def get_image(self, name, size):
+        """Returns the display-ready image scaled to ``size``, or None if it cannot be loaded."""
+        key = (name, tuple(size))
+        image = self.images.get(key)
+        if image is not None:
+            return image
+
+        with self.lock:
+            # Still decoding in the background: the caller skips this frame rather than stalling on it
+            if key in self.pending or key in self.failed:
+                return None
+            surface = self.loaded.pop(key, None)
+        if surface is None:
+            surface = self._load(*key)
+            if surface is None:
+                with self.lock:
+                    self.failed.add(key)
+                return None
+
+        # convert_alpha needs the display, so it only runs on the UI thread
+        image = surface.convert_alpha()
+        self.images[key] = image
+        return image
+
+    def _load(self, name, size):
+        source_path = os.path.join(ASSETS_DIR, name)
+        stem = os.path.splitext(name)[0]
+        cache_path = os.path.join(DISK_CACHE_DIR, f"{stem}_{size[0]}x{size[1]}.rgba")
+        if self.use_disk_cache:
+            surface = self._load_cached(cache_path, source_path, size)
+            if surface is not None:
+                return surface
+
+        started = time.perf_counter()
+        try:
+            surface = pygame.transform.scale(pygame.image.load(source_path), size)
+        except (pygame.error, OSError) as e:
+            print(f"Warning: Could not load image {name}. Animations will be disabled. Error: {e}")
+            return None
+        decode_seconds = time.perf_counter() - started
+
+        if self.use_disk_cache:
+            try:
+                os.makedirs(DISK_CACHE_DIR, exist_ok=True)
+                with open(cache_path, "wb") as f:
+                    f.write(CACHE_HEADER.pack(size[0], size[1], decode_seconds))
+                    f.write(pygame.image.tobytes(surface, "RGBA"))
+            except (pygame.error, OSError) as e:
+                print(f"Warning: Could not write asset cache {cache_path}: {e}")
+        return surface
+
+    def _load_cached(self, cache_path, source_path, size):
+        """The cached surface, or None if it is missing, stale, corrupt or slower than decoding the source."""
+        try:
+            if os.path.getmtime(cache_path) < os.path.getmtime(source_path):
+                return None
+            started = time.perf_counter()
+            with open(cache_path, "rb") as f:
+                data = f.read()
+            width, height, decode_seconds = CACHE_HEADER.unpack_from(data)
+            if (width, height) != tuple(size):
+                return None
+            surface = pygame.image.frombytes(data[CACHE_HEADER.size:], (width, height), "RGBA")
+        except (pygame.error, OSError, ValueError, struct.error):
+            return None
+        if time.perf_counter() - started > decode_seconds:
+            # Not worth it on this machine; decoding wins and the entry is not rewritten
+            self.use_disk_cache = False
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
+        return surface
@@ -0,0 +1,148 @@
+"""Headless render benchmark for UIManager.
+
+Draws every screen into an offscreen surface with the SDL dummy video
+driver and reports frame-time percentiles and memory allocated per frame.
+
+    python bench_render.py --frames 300
+    python bench_render.py --players 2 10 50 --json > bench.json
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import pygame
+import config
+from ui_manager import UIManager
+
+
+def make_app(current_state, num_players=0, round_state="WAITING_FOR_NUMBERS"):
+    """Builds a GameApp-like object with just the fields UIManager reads."""
+    app = SimpleNamespace(
+        current_state=current_state,
+        username="benchmark_user",
+        username_input_active=True,
+        username_error="",
+        player_id=None,
+        game_state={},
+        input_text="",
+        input_active=False,
+        animation_time=0,
+    )
+    if current_state != config.STATE_GAME:
+        return app
+
+    player_ids = [f"player_{i:06x}" for i in range(num_players)]
+    app.player_id = player_ids[0]
+    app.game_state = {
+        "version": 1,
+        "current_round": 3,
+        "round_state": round_state,
+        "round_message": "Round 3: Waiting for user_1 to raise a number.",
+        "players": {pid: {"score": i % 5, "raised_number": (i % 2) + 1 if i % 3 else None, "guess": None}
+                    for i, pid in enumerate(player_ids)},
+        "actual_total": None,
+        "required_players": num_players,
+        "active_player_id": player_ids[1 % num_players],
+        "player_usernames": {pid: f"user_{i}" for i, pid in enumerate(player_ids)},
+        "turn_order": player_ids,
+    }
+    return app
+
+
+def scenarios(player_counts):
+    yield "username", make_app(config.STATE_USERNAME)
+    yield "connecting", make_app(config.STATE_CONNECTING)
+    for count in player_counts:
+        yield f"game/{count}p", make_app(config.STATE_GAME, count)
+        yield f"game/{count}p/round_over", make_app(config.STATE_GAME, count, "ROUND_OVER")
+
+
+def run_scenario(ui, app, frames, animate, mode):
+    draw = ui.render if mode == "render" else ui.draw
+    ui.invalidate()
+    ui.raise_animation["active"] = False
+
+    def frame():
+        app.animation_time = pygame.time.get_ticks()
+        if animate and not ui.raise_animation["active"]:
+            ui.trigger_raise_animation(1)
+        draw(app)
+
+    # Warm the caches so the numbers describe steady state
+    for _ in range(10):
+        frame()
+
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        frame()
+        times.append((time.perf_counter() - start) * 1000)
+
+    # Allocation pass runs separately because tracing skews the timings
+    tracemalloc.start()
+    allocated = []
+    for _ in range(min(frames, 50)):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        frame()
+        allocated.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    times.sort()
+    def pct(p):
+        return times[min(len(times) - 1, int(len(times) * p))]
+    return {
+        "frames": frames,
+        "mean_ms": statistics.fmean(times),
+        "p50_ms": pct(0.50),
+        "p90_ms": pct(0.90),
+        "p99_ms": pct(0.99),
+        "max_ms": times[-1],
+        "alloc_bytes_per_frame": statistics.fmean(allocated),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offscreen UIManager render benchmark")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--players", type=int, nargs="+", default=[2, 5, 10, 25, 50])
+    parser.add_argument("--mode", choices=["draw", "render"], default="draw",
+                        help="draw: full redraw every frame; render: dirty-region path used by GameApp")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    pygame.init()
+    # convert_alpha needs a display mode, even under the dummy driver
+    pygame.display.set_mode((1, 1))
+    screen = pygame.Surface((config.SCREEN_WIDTH, config.SCREEN_HEIGHT))
+    ui = UIManager(screen)
+
+    results = []
+    for name, app in scenarios(args.players):
+        for animate in (False, True):
+            result = run_scenario(ui, app, args.frames, animate, args.mode)
+            result.update(scenario=name, animation=animate, mode=args.mode)
+            results.append(result)
+            if not args.json:
+                print(f"{name:<28} anim={'on ' if animate else 'off'} "
+                      f"p50={result['p50_ms']:6.2f}ms p90={result['p90_ms']:6.2f}ms "
+                      f"p99={result['p99_ms']:6.2f}ms max={result['max_ms']:6.2f}ms "
+                      f"alloc={result['alloc_bytes_per_frame'] / 1024:7.1f}KiB/frame")
+
+    if args.json:
+        print(json.dumps({"results": results, "cache": ui.cache_stats()}, indent=2))
+    else:
+        print(f"cache: {ui.cache_stats()}")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
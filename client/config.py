@@ -1,11 +1,23 @@
 # --- Network Settings ---
 SERVER_HOST = "localhost"
 SERVER_PORT = 8000
+SERVER_READ_PORT = 8001  # read workers serving /gamestate; None to poll SERVER_PORT
+ACCEPT_ENCODING = "gzip, deflate"  # compressed responses for large states; empty to disable
+POLL_INTERVAL = 1.0  # seconds between /gamestate polls
+NETWORK_QUEUE_SIZE = 16  # max pending commands for the network worker
 
 # --- Screen Settings ---
 SCREEN_WIDTH = 900
 SCREEN_HEIGHT = 700
 FPS = 60
+IDLE_FPS = 10  # tick rate when nothing on screen is moving
+INPUT_ACTIVE_MS = 1000  # stay at full FPS this long after user input
+TEXT_CACHE_SIZE = 256  # rendered text surfaces kept by UIManager
+BUTTON_CACHE_SIZE = 32  # pre-rendered button faces kept by UIManager
+
+# --- Assets ---
+RAISE_IMAGE_SIZE = (800, 800)
+ASSET_DISK_CACHE = False  # keep scaled images as raw RGBA in the per-user cache dir
 
 # --- Game States ---
 STATE_USERNAME = "username_input"
@@ -3,6 +3,7 @@ import sys
 import config
 from ui_manager import UIManager
 from network_client import NetworkClient
+from state_model import GameStateModel, available_actions
 
 class GameApp:
     def __init__(self):
@@ -18,32 +19,51 @@ class GameApp:
         self.username_input_active = True
         self.username_error = ""
         self.player_id = None
-        self.game_state = {}
+        self.state_model = GameStateModel()
         self.status_message = ""
         self.player_usernames = {}
         self.input_text = ""
         self.input_active = False
         self.animation_time = 0
+        self.last_input_time = 0
 
         # Components
         self.ui = UIManager(self.screen)
         self.network = NetworkClient(self)
 
+    @property
+    def game_state(self):
+        """The state on screen: the server's, with our not yet confirmed actions applied."""
+        return self.state_model.view
+
     def run(self):
         while self.running:
             self.animation_time = pygame.time.get_ticks()
             self.handle_events()
-            self.ui.draw(self)
-            pygame.display.flip()
-            self.clock.tick(config.FPS)
+            self.network.drain_inbox()
+            dirty_rects = self.ui.render(self)
+            if dirty_rects:
+                pygame.display.update(dirty_rects)
+            self.clock.tick(self.target_fps())
         self.cleanup()
 
+    def target_fps(self):
+        recently_active = self.animation_time - self.last_input_time < config.INPUT_ACTIVE_MS
+        if recently_active or self.ui.is_animating(self):
+            return config.FPS
+        return config.IDLE_FPS
+
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.running = False
                 return
 
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self.ui.invalidate()
+            elif event.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION):
+                self.last_input_time = self.animation_time
+
             if self.current_state == config.STATE_USERNAME:
                 self.handle_username_events(event)
             elif self.current_state == config.STATE_GAME:
@@ -67,29 +87,18 @@ class GameApp:
 
     def handle_game_events(self, event):
         if not self.game_state: return
-        
-        state = self.game_state
-        is_my_turn = (self.player_id == state.get('active_player_id'))
-        can_start_new = (state.get('round_state') == "ROUND_OVER")
-        can_raise = (state.get('round_state') == "WAITING_FOR_NUMBERS" and is_my_turn)
-        # Check if player is designated guesser (their turn)
-        is_guesser = False
-        if state.get('round_state') == "WAITING_FOR_GUESSES" and state.get('turn_order'):
-             guesser_idx = (state.get('current_round', 1) - 1) % len(state.get('turn_order'))
-             if guesser_idx < len(state.get('turn_order')):
-                 guesser_id = state['turn_order'][guesser_idx]
-                 is_guesser = (self.player_id == guesser_id)
-
-        can_guess = (state.get('round_state') == "WAITING_FOR_GUESSES" and is_guesser)
+
+        allowed = available_actions(self.game_state, self.player_id)
+        can_start_new, can_raise, can_guess = allowed["start_new"], allowed["raise"], allowed["guess"]
 
         if event.type == pygame.MOUSEBUTTONDOWN:
             if can_start_new and self.ui.btn_start_new_rect.collidepoint(event.pos):
-                self.network.send_action("start_new_round")
+                self.send_action("start_new_round")
             elif can_raise and self.ui.btn_raise_1_rect.collidepoint(event.pos):
-                self.network.send_action("raise_number", {"number": 1})
+                self.send_action("raise_number", {"number": 1})
                 self.ui.trigger_raise_animation(1)
             elif can_raise and self.ui.btn_raise_2_rect.collidepoint(event.pos):
-                self.network.send_action("raise_number", {"number": 2})
+                self.send_action("raise_number", {"number": 2})
                 self.ui.trigger_raise_animation(2)
             elif can_guess and self.ui.btn_guess_rect.collidepoint(event.pos):
                 self.submit_guess()
@@ -110,10 +119,16 @@ class GameApp:
             self.username_error = ""
             self.network.connect()
 
+    def send_action(self, action_type, data=None):
+        """Shows the predicted outcome right away and sends the action; the reply reconciles it."""
+        data = data or {}
+        action_id = self.state_model.predict(self.player_id, action_type, data)
+        self.network.send_action(action_type, data, action_id=action_id)
+
     def submit_guess(self):
         if self.input_text:
             try:
-                self.network.send_action("make_guess", {"guess": int(self.input_text)})
+                self.send_action("make_guess", {"guess": int(self.input_text)})
                 self.input_text = ""
                 self.input_active = False
             except ValueError:
@@ -121,11 +136,26 @@ class GameApp:
 
     def process_server_message(self, message):
         msg_type = message.get("type")
-        if msg_type == "game_state":
+        if msg_type == "connected":
+            self.handle_connected(message["player_id"])
+        elif msg_type == "disconnected":
+            self.running = False
+        elif msg_type == "connection_error":
+            self.handle_connection_error(message.get("message", "Unknown error"))
+        elif msg_type == "game_state":
             new_state = message.get("data", {})
-            if "player_usernames" in new_state:
+            # Stale responses overtaken by a newer one are ignored
+            if self.state_model.apply_server_state(new_state) and "player_usernames" in new_state:
                 self.player_usernames.update(new_state["player_usernames"])
-            self.game_state = new_state
+        elif msg_type == "action_result":
+            new_state = message.get("state")
+            if new_state and "player_usernames" in new_state:
+                self.player_usernames.update(new_state["player_usernames"])
+            # Drops the prediction; a rejected one is rolled back to the server's state
+            self.state_model.resolve(message["action_id"], new_state)
+            if not message.get("accepted"):
+                self.status_message = f"Action rejected: {message.get('message', '')}"
+                print(self.status_message)
         elif msg_type == "error":
             error_msg = message.get('message', 'Unknown error')
             if self.current_state == config.STATE_CONNECTING:
@@ -134,6 +164,12 @@ class GameApp:
                 self.status_message = f"Server Error: {error_msg}"
             print(f"Server Error: {error_msg}")
 
+    def handle_connected(self, player_id):
+        self.player_id = player_id
+        self.current_state = config.STATE_GAME
+        pygame.display.set_caption(f"Number Guess Game - {self.username}")
+        self.player_usernames[self.player_id] = self.username
+
     def handle_connection_error(self, error_msg):
         self.username_error = error_msg
         self.current_state = config.STATE_USERNAME
@@ -1,102 +1,213 @@
 import socket
 import threading
 import json
+import gzip
+import zlib
 import time
+import queue
+from collections import deque
 import config
-import pygame
 
 class NetworkClient:
+    """Talks to the server from a single background worker thread.
+
+    The UI thread only enqueues commands (connect, action, poll, disconnect);
+    the worker executes them one at a time and posts the results to an inbox
+    that the UI drains once per frame with ``drain_inbox``.
+    """
+
     def __init__(self, app):
         self.app = app
         self.running = True
-        self.polling_thread = None
+        self.polling = False
+        self.player_id = None
+        self.room_id = None
+        self.state_version = None
+        self.commands = deque()
+        self.commands_cond = threading.Condition()
+        self.inbox = queue.SimpleQueue()
+        self.worker = threading.Thread(target=self._worker_loop, daemon=True)
+        self.worker.start()
 
     def connect(self):
         self.app.current_state = config.STATE_CONNECTING
         self.app.status_message = "Connecting to server..."
-        
-        connect_thread = threading.Thread(target=self._try_connect, daemon=True)
-        connect_thread.start()
+        self._enqueue(("connect", self.app.username))
+
+    def send_action(self, action_type, data=None, action_id=None):
+        """Queues an action; its outcome is posted as an ``action_result`` carrying ``action_id``."""
+        self._enqueue(("action", action_type, data or {}, action_id))
+
+    def poll_once(self):
+        self._enqueue(("poll",))
+
+    def drain_inbox(self):
+        while True:
+            try:
+                message = self.inbox.get_nowait()
+            except queue.Empty:
+                return
+            self.app.process_server_message(message)
+
+    @staticmethod
+    def _command_key(command):
+        # Actions carry a unique id for reconciliation; duplicates are judged without it
+        return command[:3] if command[0] == "action" else command
+
+    def _resolve_dropped(self, command, accepted, reason=""):
+        if command[0] == "action":
+            self.inbox.put({"type": "action_result", "action_id": command[3], "accepted": accepted,
+                            "message": reason, "state": None})
+
+    def _enqueue(self, command):
+        with self.commands_cond:
+            if any(self._command_key(c) == self._command_key(command) for c in self.commands):
+                # Merged into the identical queued action, whose own result reports the outcome
+                self._resolve_dropped(command, accepted=True)
+                return
+            if command[0] == "poll" and any(c[0] in ("action", "poll") for c in self.commands):
+                # A pending action already brings back a fresh state
+                return
+            if command[0] == "action":
+                self.commands = deque(c for c in self.commands if c[0] != "poll")
+            if len(self.commands) >= config.NETWORK_QUEUE_SIZE:
+                print(f"Network queue full, dropping command: {command[0]}")
+                # Lets the app roll back the prediction it made for a dropped action
+                self._resolve_dropped(command, accepted=False, reason="Too many pending requests.")
+                return
+            self.commands.append(command)
+            self.commands_cond.notify()
+
+    def _next_command(self, next_poll):
+        with self.commands_cond:
+            while not self.commands:
+                if not self.running:
+                    return None
+                if self.polling:
+                    timeout = next_poll - time.monotonic()
+                    if timeout <= 0:
+                        return ("poll",)
+                    self.commands_cond.wait(timeout)
+                else:
+                    self.commands_cond.wait()
+            return self.commands.popleft()
+
+    def _take_queued_actions(self):
+        """Pops the actions queued right behind the current one so they share its round trip."""
+        actions = []
+        with self.commands_cond:
+            while self.commands and self.commands[0][0] == "action":
+                actions.append(self.commands.popleft())
+        return actions
+
+    def _worker_loop(self):
+        next_poll = time.monotonic()
+        while True:
+            command = self._next_command(next_poll)
+            if command is None:
+                return
+            try:
+                if command[0] == "connect":
+                    self._try_connect(command[1])
+                elif command[0] == "action":
+                    self._send_actions([command] + self._take_queued_actions())
+                elif command[0] == "poll":
+                    self._poll()
+                elif command[0] == "disconnect":
+                    self._send_disconnect()
+                    return
+            except Exception as e:
+                print(f"Network worker error during {command[0]}: {e}")
+            next_poll = time.monotonic() + config.POLL_INTERVAL
 
-    def _try_connect(self):
+    def _try_connect(self, username):
         try:
-            payload = json.dumps({"username": self.app.username})
+            payload = json.dumps({"username": username})
             response_data = self.send_request('POST', '/connect', payload)
             
             if response_data and response_data.get("player_id"):
-                self.app.player_id = response_data.get("player_id")
-                self.app.current_state = config.STATE_GAME
-                pygame.display.set_caption(f"Number Guess Game - {self.app.username}")
-                self.app.player_usernames[self.app.player_id] = self.app.username
+                self.player_id = response_data.get("player_id")
+                self.room_id = response_data.get("room_id")
+                self.inbox.put({"type": "connected", "player_id": self.player_id})
                 # Polling because http
-                self.start_polling()
-            else:
-                pass
+                self.polling = True
+                self._poll()
 
         except Exception as e:
-            self.app.handle_connection_error(f"Connection failed: {e}")
+            self._post_connection_error(f"Connection failed: {e}")
 
-    def start_polling(self):
-        self.polling_thread = threading.Thread(target=self.polling_loop, daemon=True)
-        self.running = True
-        self.polling_thread.start()
+    def _poll(self):
+        if not self.player_id:
+            return
+        if config.SERVER_READ_PORT and self.room_id:
+            # Read workers serve the room's published state; fall back to the main port if it is missing
+            headers = {"X-Player-ID": self.player_id, "X-Room-ID": self.room_id}
+            state_data = self.send_request('GET', '/gamestate', headers=headers,
+                                           port=config.SERVER_READ_PORT, report_errors=False)
+            if state_data:
+                self._track_version(state_data)
+                self.inbox.put({"type": "game_state", "data": state_data})
+                return
+        headers = {"X-Player-ID": self.player_id}
+        state_data = self.send_request('GET', '/gamestate', headers=headers)
+        if state_data:
+            self.room_id = state_data.get("room_id")
+            self._track_version(state_data)
+            self.inbox.put({"type": "game_state", "data": state_data})
+        else:
+            print("Polling failed, server might be down. Disconnecting.")
+            self.polling = False
+            self.inbox.put({"type": "disconnected"})
 
-    def polling_loop(self):
-        while self.running:
-            try:
-                if not self.app.player_id: # Don't poll if we don't have an ID
-                    time.sleep(1)
-                    continue
-                headers = {"X-Player-ID": self.app.player_id}
-                state_data = self.send_request('GET', '/gamestate', headers=headers)
-                if state_data:
-                    self.app.process_server_message({"type": "game_state", "data": state_data})
-                else:
-                    print("Polling failed, server might be down. Disconnecting.")
-                    self.running = False
-                time.sleep(1)
-            except Exception as e:
-                print(f"Error polling game state: {e}")
-                self.running = False
-        
-        self.app.running = False
+    def _track_version(self, state):
+        # Only a room's version is meaningful as "since"; the matchmaking placeholder has its own counter
+        self.state_version = state.get("version") if state.get("room_id") else None
 
-    def send_action(self, action_type, data={}):
-        action_thread = threading.Thread(target=self._send_action_thread, args=(action_type, data), daemon=True)
-        action_thread.start()
-        
-    def _send_action_thread(self, action_type, data):
+    def _send_actions(self, commands):
+        """Sends queued actions plus a state fetch as one ``/batch`` request."""
+        results = [{"type": "action_result", "action_id": action_id, "accepted": False,
+                    "message": "No response from server.", "state": None}
+                   for _, _, _, action_id in commands]
         try:
-            payload_dict = {"action": action_type, **data}
-            payload_str = json.dumps(payload_dict)
-            headers = {"X-Player-ID": self.app.player_id}
-            response = self.send_request('POST', '/action', payload_str, headers)
-            # After sending an action, immediately poll for the new state (no need to wait the full delay)
+            ops = [{"op": "action", "action": action_type, **data} for _, action_type, data, _ in commands]
+            ops.append({"op": "state", "since": self.state_version})
+            headers = {"X-Player-ID": self.player_id}
+            response = self.send_request('POST', '/batch', json.dumps({"ops": ops}), headers)
             if response:
-                self.poll_once()
+                *action_results, state_result = response["results"]
+                # The batch ends with the post-action state, so no extra poll is needed
+                state = state_result.get("state")
+                if state:
+                    self.room_id = state.get("room_id")
+                    self._track_version(state)
+                for result, action_result in zip(results, action_results):
+                    result.update(accepted=action_result.get("status") == "ok",
+                                  message=action_result.get("message", ""))
+                results[-1]["state"] = state
         except Exception as e:
-            print(f"Failed to send action: {e}")
+            print(f"Failed to send actions: {e}")
+        # Always answered, so the app can drop its predictions even when the request failed
+        for result in results:
+            self.inbox.put(result)
 
-    def poll_once(self):
-        try:
-            headers = {"X-Player-ID": self.app.player_id}
-            state_data = self.send_request('GET', '/gamestate', headers=headers)
-            if state_data:
-                self.app.process_server_message({"type": "game_state", "data": state_data})
-        except Exception as e:
-            print(f"Error during single poll: {e}")
+    def _post_connection_error(self, error_msg):
+        self.inbox.put({"type": "connection_error", "message": error_msg})
 
-    def send_request(self, method, path, body=None, headers={}):
+    def send_request(self, method, path, body=None, headers={}, port=None, report_errors=True):
+        port = port or config.SERVER_PORT
+        report_error = self._post_connection_error if report_errors else print
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
                 client_socket.settimeout(10.0)
-                client_socket.connect((config.SERVER_HOST, config.SERVER_PORT))
+                client_socket.connect((config.SERVER_HOST, port))
                 
                 request_line = f"{method} {path} HTTP/1.1\r\n"
-                host_header = f"Host: {config.SERVER_HOST}:{config.SERVER_PORT}\r\n"
+                host_header = f"Host: {config.SERVER_HOST}:{port}\r\n"
                 
                 final_headers = headers.copy()
                 final_headers['Connection'] = 'close'
+                if config.ACCEPT_ENCODING:
+                    final_headers['Accept-Encoding'] = config.ACCEPT_ENCODING
 
                 if body:
                     final_headers['Content-Type'] = 'application/json'
@@ -119,12 +230,12 @@ class NetworkClient:
                     buffer += chunk
 
                 if not buffer:
-                    self.app.handle_connection_error("Received empty response from server.")
+                    report_error("Received empty response from server.")
                     return None
 
                 header_end_idx = buffer.find(b'\r\n\r\n')
                 if header_end_idx == -1:
-                    self.app.handle_connection_error("Invalid HTTP response (no header separator).")
+                    report_error("Invalid HTTP response (no header separator).")
                     return None
                     
                 header_part = buffer[:header_end_idx]
@@ -134,34 +245,45 @@ class NetworkClient:
                 response_line = response_headers.split('\r\n')[0]
                 status_code = int(response_line.split(' ')[1])
 
+                content_encoding = next((line.split(':', 1)[1].strip().lower()
+                                         for line in response_headers.split('\r\n')[1:]
+                                         if line.lower().startswith('content-encoding:')), None)
+                if content_encoding == 'gzip':
+                    body_part = gzip.decompress(body_part)
+                elif content_encoding == 'deflate':
+                    body_part = zlib.decompress(body_part)
+
                 response_body = json.loads(body_part.decode('utf-8'))
 
                 if status_code >= 400:
                     error_msg = response_body.get('error', 'Unknown server error')
                     print(f"Server Error (HTTP {status_code}): {error_msg}")
-                    self.app.handle_connection_error(error_msg)
+                    report_error(error_msg)
                     return None
                     
                 return response_body
 
-        except (socket.error, socket.timeout, ConnectionRefusedError, json.JSONDecodeError, IndexError) as e:
-            self.app.handle_connection_error(f"Communication error: {e}")
+        # socket.error is OSError, which also covers gzip.BadGzipFile
+        except (socket.error, socket.timeout, ConnectionRefusedError, json.JSONDecodeError, IndexError,
+                EOFError, zlib.error) as e:
+            report_error(f"Communication error: {e}")
             return None
         
     def close(self):
-        self.running = False
-        if self.app.player_id:
-            disconnect_thread = threading.Thread(target=self._send_disconnect, daemon=True)
-            disconnect_thread.start()
-        
-        if self.polling_thread and self.polling_thread.is_alive():
-            self.polling_thread.join(timeout=1.0)
+        with self.commands_cond:
+            self.running = False
+            self.polling = False
+            # Pending actions are pointless once we leave; only the disconnect matters
+            self.commands.clear()
+            if self.player_id:
+                self.commands.append(("disconnect",))
+            self.commands_cond.notify()
+        self.worker.join(timeout=1.0)
             
     def _send_disconnect(self):
         try:
-            headers = {"X-Player-ID": self.app.player_id}
+            headers = {"X-Player-ID": self.player_id}
             self.send_request('POST', '/disconnect', headers=headers)
             print("Sent disconnect message to server.")
         except Exception as e:
             print(f"Failed to send disconnect message: {e}")
-
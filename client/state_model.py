@@ -0,0 +1,125 @@
+import copy
+
+def guesser_id(state):
+    """The designated guesser of the current round, who rotates with the round number."""
+    turn_order = state.get('turn_order') or []
+    if not turn_order:
+        return None
+    return turn_order[(state.get('current_round', 1) - 1) % len(turn_order)]
+
+def available_actions(state, player_id):
+    """What ``player_id`` may do in ``state``; the single place the UI and input handling ask."""
+    round_state = state.get('round_state')
+    me = state.get('players', {}).get(player_id, {})
+    return {
+        "start_new": round_state == "ROUND_OVER",
+        "raise": (round_state == "WAITING_FOR_NUMBERS" and player_id == state.get('active_player_id')
+                  and me.get('raised_number') is None),
+        "guess": (round_state == "WAITING_FOR_GUESSES" and player_id == guesser_id(state)
+                  and me.get('guess') is None),
+    }
+
+def _username(state, player_id):
+    return state.get('player_usernames', {}).get(player_id, player_id)
+
+def predict_action(state, player_id, action_type, data):
+    """Returns the state the server should answer with, or None if the action would be rejected.
+
+    Mirrors the server's turn rules but never guesses hidden information: a
+    predicted guess only marks the guess as submitted, the result waits for
+    the server.
+    """
+    allowed = available_actions(state, player_id)
+    predicted = copy.deepcopy(state)
+    players = predicted.get('players', {})
+    turn_order = predicted.get('turn_order', [])
+
+    if action_type == "raise_number" and allowed["raise"] and data.get("number") in (1, 2):
+        players[player_id]['raised_number'] = data["number"]
+        next_player_id = next((pid for pid in turn_order if players[pid]['raised_number'] is None), None)
+        if next_player_id is None:
+            predicted['round_state'] = "WAITING_FOR_GUESSES"
+            predicted['active_player_id'] = guesser_id(predicted)
+            predicted['round_message'] = (f"All numbers are in! Waiting for "
+                                          f"{_username(predicted, predicted['active_player_id'])} to submit a guess.")
+        else:
+            predicted['active_player_id'] = next_player_id
+            predicted['round_message'] = f"Waiting for {_username(predicted, next_player_id)} to raise a number."
+        return predicted
+
+    if action_type == "make_guess" and allowed["guess"]:
+        guess = data.get("guess")
+        if not (isinstance(guess, int) and len(players) <= guess <= len(players) * 2):
+            return None
+        players[player_id]['guess'] = guess
+        predicted['round_message'] = f"{_username(predicted, player_id)} guessed {guess}. Revealing the total..."
+        return predicted
+
+    if action_type == "start_new_round" and allowed["start_new"] and turn_order:
+        predicted['current_round'] = predicted.get('current_round', 0) + 1
+        predicted['round_state'] = "WAITING_FOR_NUMBERS"
+        predicted['actual_total'] = None
+        for pdata in players.values():
+            pdata.update({'raised_number': None, 'guess': None})
+        predicted['active_player_id'] = turn_order[0]
+        predicted['round_message'] = (f"Round {predicted['current_round']}: Waiting for "
+                                      f"{_username(predicted, turn_order[0])} to raise a number.")
+        return predicted
+
+    return None
+
+
+class GameStateModel:
+    """The last authoritative server state plus local predictions layered on top.
+
+    ``view`` is what the client shows: the confirmed state with every pending
+    action re-applied in order. A server state newer than the confirmed one
+    replaces it and the pending actions are replayed on top; an action the
+    server answered is dropped from the pending list, which rolls a rejected
+    prediction back without any special casing.
+    """
+
+    def __init__(self):
+        self.confirmed = {}
+        self.pending = []
+        self.view = {}
+        self.next_action_id = 1
+
+    def _is_stale(self, state):
+        # Versions count per room; the matchmaking placeholder (no room) and other rooms are never stale
+        return (state.get("room_id") is not None and state.get("room_id") == self.confirmed.get("room_id")
+                and state.get("version", 0) < self.confirmed.get("version", 0))
+
+    def apply_server_state(self, state):
+        """Adopts ``state`` unless it is older than what we have; returns whether it was adopted."""
+        if self._is_stale(state):
+            return False
+        self.confirmed = state
+        self._rebuild()
+        return True
+
+    def predict(self, player_id, action_type, data):
+        """Records an action about to be sent and returns its id for ``resolve``."""
+        action_id = self.next_action_id
+        self.next_action_id += 1
+        self.pending.append((action_id, player_id, action_type, data))
+        self._rebuild()
+        return action_id
+
+    def resolve(self, action_id, state=None):
+        """The server answered ``action_id``, with its post-action state if it sent one."""
+        self.pending = [entry for entry in self.pending if entry[0] != action_id]
+        if state and not self._is_stale(state):
+            self.confirmed = state
+        self._rebuild()
+
+    def _rebuild(self):
+        view = self.confirmed
+        predicted = 0
+        for _, player_id, action_type, data in self.pending:
+            next_view = predict_action(view, player_id, action_type, data)
+            if next_view is not None:
+                view = next_view
+                predicted += 1
+        # Lets the renderer tell a predicted frame from the confirmed state of the same version
+        self.view = dict(view, predicted=predicted) if predicted else view
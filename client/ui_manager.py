@@ -1,6 +1,9 @@
 import pygame
 import math
 import config
+from render_cache import SurfaceCache
+from asset_manager import AssetManager
+from state_model import available_actions
 
 class UIManager:
     def __init__(self, screen):
@@ -19,19 +22,15 @@ class UIManager:
             self.font_small = pygame.font.Font(pygame.font.get_default_font(), 24)
 
 
-        try:
-            self.thumb_image = pygame.image.load("assets/thumb.png").convert_alpha()
-            self.twothumbs_image = pygame.image.load("assets/twoThumbs.png").convert_alpha()
-            self.thumb_image = pygame.transform.scale(self.thumb_image, (800, 800))
-            self.twothumbs_image = pygame.transform.scale(self.twothumbs_image, (800, 800))
-        except pygame.error as e:
-            print(f"Warning: Could not load button images. Animations will be disabled. Error: {e}")
-            self.thumb_image = None
-            self.twothumbs_image = None
+        # Images are decoded and scaled in the background; the raise animation picks them up later
+        self.assets = AssetManager(use_disk_cache=config.ASSET_DISK_CACHE)
+        self.assets.preload("thumb.png", config.RAISE_IMAGE_SIZE)
+        self.assets.preload("twoThumbs.png", config.RAISE_IMAGE_SIZE)
 
         # Animation control
         self.raise_animation = {
             "active": False,
+            "image_name": None,
             "image": None,
             "start_time": 0,
             "duration": 1500
@@ -39,8 +38,18 @@ class UIManager:
         
         # UI Elements setup
         self._username_connect_btn_rect = None
+        self._username_input_rect = None
         self.setup_ui_elements()
 
+        # Rendered text and button faces, reused across frames
+        self.text_cache = SurfaceCache(config.TEXT_CACHE_SIZE)
+        self.button_cache = SurfaceCache(config.BUTTON_CACHE_SIZE)
+
+        # Dirty-region tracking
+        self._gradient_cache = {}
+        self._last_scene_key = None
+        self._last_widget_keys = {}
+
     def get_connect_button_rect(self):
         return self._username_connect_btn_rect
 
@@ -61,6 +70,64 @@ class UIManager:
         self.btn_guess_rect = pygame.Rect(start_x + button_width + padding, y_row_2, button_width, button_height)
         self.btn_start_new_rect = pygame.Rect(config.SCREEN_WIDTH//2 - button_width//2, y_row_2, button_width, button_height)
 
+    def invalidate(self):
+        """Forces a full redraw on the next render."""
+        self._last_scene_key = None
+
+    def is_animating(self, app_state):
+        return self.raise_animation["active"] or app_state.current_state == config.STATE_USERNAME
+
+    def render(self, app_state):
+        """Redraws what changed since the last frame and returns the dirty rects."""
+        scene_key = self._scene_key(app_state)
+        if scene_key != self._last_scene_key or self.raise_animation["active"]:
+            self.draw(app_state)
+            dirty = [self.screen.get_rect()]
+        else:
+            widget_keys = self._widget_keys(app_state)
+            dirty = [pygame.Rect(rect).inflate(6, 6) for name, (rect, key) in widget_keys.items()
+                     if self._last_widget_keys.get(name) != (rect, key)]
+            if dirty:
+                # One clipped draw covers every changed widget; pixels between them redraw unchanged
+                self.screen.set_clip(dirty[0].unionall(dirty[1:]))
+                self.draw(app_state)
+                self.screen.set_clip(None)
+
+        # Rects are only known once the page has been drawn at least once
+        self._last_scene_key = scene_key
+        self._last_widget_keys = self._widget_keys(app_state)
+        return dirty
+
+    def _scene_key(self, app_state):
+        if app_state.current_state == config.STATE_USERNAME:
+            float_offset = math.floor(math.sin(app_state.animation_time * 0.002) * 5)
+            return (app_state.current_state, app_state.username, app_state.username_error, float_offset)
+        if app_state.current_state == config.STATE_CONNECTING:
+            return (app_state.current_state, (pygame.time.get_ticks() // 500) % 4)
+        state = app_state.game_state
+        return (app_state.current_state, app_state.player_id, state.get("room_id"), state.get("version", id(state)),
+                state.get("predicted", 0))
+
+    def _widget_keys(self, app_state):
+        mouse_pos = pygame.mouse.get_pos()
+        caret_on = (pygame.time.get_ticks() // 500) % 2
+        widgets = {}
+        if app_state.current_state == config.STATE_USERNAME:
+            if self._username_connect_btn_rect:
+                rect = self._username_connect_btn_rect
+                widgets["connect"] = (tuple(rect), rect.collidepoint(mouse_pos))
+            if self._username_input_rect:
+                rect = self._username_input_rect
+                widgets["username"] = (tuple(rect), app_state.username_input_active and caret_on)
+        elif app_state.current_state == config.STATE_GAME:
+            for name, rect in (("raise_1", self.btn_raise_1_rect), ("raise_2", self.btn_raise_2_rect),
+                               ("guess", self.btn_guess_rect), ("start_new", self.btn_start_new_rect)):
+                widgets[name] = (tuple(rect), rect.collidepoint(mouse_pos))
+            rect = self.input_box_rect
+            widgets["input"] = (tuple(rect), (app_state.input_text, app_state.input_active,
+                                              app_state.input_active and caret_on))
+        return widgets
+
     def draw(self, app_state):
         self.screen.fill(config.COLOR_BG)
         if app_state.current_state == config.STATE_USERNAME:
@@ -70,8 +137,7 @@ class UIManager:
         elif app_state.current_state == config.STATE_GAME:
             self.draw_game_page(app_state)
         
-        if self.thumb_image and self.twothumbs_image:
-            self.draw_raise_animation()
+        self.draw_raise_animation()
 
     def draw_username_input_page(self, state):
         self.draw_gradient_rect(pygame.Rect(0, 0, config.SCREEN_WIDTH, config.SCREEN_HEIGHT), 
@@ -88,6 +154,7 @@ class UIManager:
         
         input_rect = pygame.Rect(config.SCREEN_WIDTH//2 - 200, config.SCREEN_HEIGHT//2 - 20 + float_offset, 400, 60)
         self.draw_input_field(input_rect, state.username, state.username_input_active, "Enter username...")
+        self._username_input_rect = input_rect
         
         btn_rect = pygame.Rect(config.SCREEN_WIDTH//2 - 100, config.SCREEN_HEIGHT//2 + 60 + float_offset, 200, 50)
         self.draw_button(btn_rect, "Connect", enabled=len(state.username.strip()) > 0)
@@ -151,24 +218,9 @@ class UIManager:
         self.draw_action_buttons(state_data)
     
     def draw_action_buttons(self, state_data):
-        state = state_data.game_state
-        is_my_turn = (state_data.player_id == state.get('active_player_id'))
-        
-        can_start_new = (state.get('round_state') == "ROUND_OVER")
-        can_raise = (state.get('round_state') == "WAITING_FOR_NUMBERS" and is_my_turn)
-
-        # Determine if the current player is the designated guesser
-        is_guesser = False
-        turn_order = state.get('turn_order', [])
-        if state.get('round_state') == "WAITING_FOR_GUESSES" and turn_order:
-             current_round = state.get('current_round', 1)
-             guesser_idx = (current_round - 1) % len(turn_order)
-             if guesser_idx < len(turn_order):
-                 guesser_id = turn_order[guesser_idx]
-                 is_guesser = (state_data.player_id == guesser_id)
+        allowed = available_actions(state_data.game_state, state_data.player_id)
+        can_start_new, can_raise, can_guess = allowed["start_new"], allowed["raise"], allowed["guess"]
 
-        can_guess = (state.get('round_state') == "WAITING_FOR_GUESSES" and is_guesser)
-        
         if can_start_new:
             self.draw_button(self.btn_start_new_rect, "Start Next Round", enabled=True, style="secondary")
         else:
@@ -181,7 +233,8 @@ class UIManager:
 
     def trigger_raise_animation(self, number):
         self.raise_animation["active"] = True
-        self.raise_animation["image"] = self.thumb_image if number == 1 else self.twothumbs_image
+        self.raise_animation["image_name"] = "thumb.png" if number == 1 else "twoThumbs.png"
+        self.raise_animation["image"] = None
         self.raise_animation["start_time"] = pygame.time.get_ticks()
 
     def draw_raise_animation(self):
@@ -194,12 +247,24 @@ class UIManager:
         shake_offset_x = math.sin(pygame.time.get_ticks() * 0.05) * 10
         shake_offset_y = math.cos(pygame.time.get_ticks() * 0.07) * 10
         image = self.raise_animation["image"]
+        if image is None:
+            # Preload may still be running; skip frames until it lands instead of waiting on it
+            image = self.assets.get_image(self.raise_animation["image_name"], config.RAISE_IMAGE_SIZE)
+            if image is None:
+                return
+            self.raise_animation["image"] = image
         image_rect = image.get_rect(center=(config.SCREEN_WIDTH//2 + int(shake_offset_x), config.SCREEN_HEIGHT//2 + int(shake_offset_y)))
         self.screen.blit(image, image_rect)
 
 
+    def cache_stats(self):
+        return {"text": self.text_cache.stats(), "buttons": self.button_cache.stats()}
+
+    def render_text(self, text, font, color):
+        return self.text_cache.get((text, font, tuple(color)), lambda: font.render(text, True, color))
+
     def draw_text(self, text, font, color, x, y, center=False, v_center=False):
-        text_surface = font.render(text, True, color)
+        text_surface = self.render_text(text, font, color)
         text_rect = text_surface.get_rect()
         if center:
             text_rect.center = (x, y)
@@ -210,13 +275,20 @@ class UIManager:
         self.screen.blit(text_surface, text_rect)
 
     def draw_gradient_rect(self, rect, color1, color2, vertical=True):
-        if vertical:
+        if not vertical:
+            return
+        cache_key = (rect.size, color1, color2)
+        gradient = self._gradient_cache.get(cache_key)
+        if gradient is None:
+            gradient = pygame.Surface(rect.size)
             for y_offset in range(rect.height):
                 ratio = y_offset / rect.height
                 r = int(color1[0] + (color2[0] - color1[0]) * ratio)
                 g = int(color1[1] + (color2[1] - color1[1]) * ratio)
                 b = int(color1[2] + (color2[2] - color1[2]) * ratio)
-                pygame.draw.line(self.screen, (r, g, b), (rect.x, rect.y + y_offset), (rect.x + rect.width, rect.y + y_offset))
+                pygame.draw.line(gradient, (r, g, b), (0, y_offset), (rect.width, y_offset))
+            self._gradient_cache[cache_key] = gradient
+        self.screen.blit(gradient, rect.topleft)
     
     def draw_shadow_rect(self, rect, color, shadow_offset=3):
         shadow_rect = rect.copy()
@@ -226,8 +298,12 @@ class UIManager:
 
     def draw_button(self, rect, text, enabled=True, style="primary"):
         mouse_pos = pygame.mouse.get_pos()
-        is_hovering = rect.collidepoint(mouse_pos)
-        
+        is_hovering = enabled and rect.collidepoint(mouse_pos)
+        cache_key = (rect.size, text, style, enabled, is_hovering)
+        face = self.button_cache.get(cache_key, lambda: self.render_button_face(rect.size, text, enabled, style, is_hovering))
+        self.screen.blit(face, rect.topleft)
+
+    def render_button_face(self, size, text, enabled, style, is_hovering):
         color_map = {
             "primary": (config.COLOR_PRIMARY, config.COLOR_PRIMARY_HOVER),
             "secondary": (config.COLOR_SECONDARY, config.COLOR_SECONDARY_HOVER),
@@ -242,13 +318,18 @@ class UIManager:
         else:
             final_color = config.COLOR_INPUT_BORDER_INACTIVE
         
+        # Room for the drop shadow below and to the right of the button
+        face = pygame.Surface((size[0] + 2, size[1] + 2), pygame.SRCALPHA)
+        rect = pygame.Rect((0, 0), size)
         if enabled:
             shadow_rect = rect.copy(); shadow_rect.move_ip(2, 2)
-            pygame.draw.rect(self.screen, config.COLOR_SHADOW, shadow_rect, border_radius=8)
+            pygame.draw.rect(face, config.COLOR_SHADOW, shadow_rect, border_radius=8)
         
-        pygame.draw.rect(self.screen, final_color, rect, border_radius=8)
+        pygame.draw.rect(face, final_color, rect, border_radius=8)
         text_color = config.COLOR_TEXT if enabled else config.COLOR_TEXT_SECONDARY
-        self.draw_text(text, self.font_medium, text_color, rect.centerx, rect.centery, center=True)
+        text_surface = self.render_text(text, self.font_medium, text_color)
+        face.blit(text_surface, text_surface.get_rect(center=rect.center))
+        return face
 
     def draw_input_field(self, rect, text, active, placeholder=""):
         pygame.draw.rect(self.screen, config.COLOR_INPUT_BG, rect, border_radius=8)
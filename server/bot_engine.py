@@ -0,0 +1,77 @@
+import argparse
+import numpy as np
+
+class OutcomeEngine:
+    """Vectorized probability model for the total of everyone's 1/2 raises.
+
+    Every other player is assumed to raise 2 with probability
+    ``raise_two_probability``. ``pmf[k, j]`` is the chance that exactly ``j``
+    of ``k`` other players raised 2, so the best guess for a guesser who
+    raised ``own`` in a room of ``n`` players is
+    ``own + (n - 1) + argmax(pmf[n - 1])``. Decisions for any number of bots
+    are computed with a handful of array operations.
+    """
+
+    def __init__(self, raise_two_probability=0.5, max_players=64, seed=None):
+        self.p = raise_two_probability
+        self.max_players = max_players
+        self.rng = np.random.default_rng(seed)
+
+        pmf = np.zeros((max_players, max_players))
+        pmf[0, 0] = 1.0
+        for k in range(1, max_players):
+            pmf[k, 1:] = pmf[k - 1, :-1] * self.p
+            pmf[k] += pmf[k - 1] * (1 - self.p)
+        self.pmf = pmf
+        self.best_twos = pmf.argmax(axis=1)
+        self.best_probability = pmf.max(axis=1)
+
+    def choose_raises(self, count):
+        return 1 + (self.rng.random(count) < self.p).astype(np.int64)
+
+    def choose_guesses(self, num_players, own_raises):
+        """Best guesses for arrays of room sizes and the guessers' own raises."""
+        others = np.asarray(num_players) - 1
+        return np.asarray(own_raises) + others + self.best_twos[others]
+
+    def win_probability(self, num_players):
+        return self.best_probability[np.asarray(num_players) - 1]
+
+    def simulate(self, num_players, rounds, max_chunk_cells=20_000_000):
+        """Plays out ``rounds`` rounds where every seat follows the engine's policy."""
+        chunk = max(1, max_chunk_cells // num_players)
+        wins = 0
+        played = 0
+        while played < rounds:
+            size = min(chunk, rounds - played)
+            raises = 1 + (self.rng.random((size, num_players)) < self.p)
+            totals = raises.sum(axis=1)
+            # Seat 0 guesses; seats are exchangeable so this loses no generality
+            guesses = self.choose_guesses(np.full(size, num_players), raises[:, 0])
+            wins += int(np.count_nonzero(guesses == totals))
+            played += size
+        return {
+            "players": num_players,
+            "rounds": rounds,
+            "wins": wins,
+            "win_rate": wins / rounds if rounds else 0.0,
+            "expected_win_rate": float(self.win_probability(num_players)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate bot rounds for balancing")
+    parser.add_argument("--players", type=int, nargs="+", default=[2, 3, 4, 6, 8])
+    parser.add_argument("--rounds", type=int, default=1_000_000)
+    parser.add_argument("--p", type=float, default=0.5, help="probability that a player raises 2")
+    args = parser.parse_args()
+
+    engine = OutcomeEngine(raise_two_probability=args.p, max_players=max(args.players) + 1)
+    for num_players in args.players:
+        result = engine.simulate(num_players, args.rounds)
+        print(f"{num_players} players: win rate {result['win_rate']:.4f} "
+              f"(expected {result['expected_win_rate']:.4f}) over {result['rounds']} rounds")
+
+
+if __name__ == "__main__":
+    main()
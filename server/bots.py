@@ -0,0 +1,129 @@
+import threading
+import time
+import uuid
+import logging
+import numpy as np
+from bot_engine import OutcomeEngine
+from game_logic import BOT_ID_PREFIX, is_bot
+
+class BotManager(threading.Thread):
+    """Fills idle seats with server-side bots and plays their turns in batches.
+
+    Every tick it adds bots to matchmaking queues and rooms that have been
+    waiting longer than ``fill_delay`` seconds, then collects every bot whose
+    turn it is across all rooms and asks the OutcomeEngine for all of their
+    raises and guesses at once. Rooms left with only bots are dissolved.
+    """
+
+    def __init__(self, matchmaker, tick=0.5, fill_delay=10.0, engine=None):
+        super().__init__(daemon=True)
+        self.matchmaker = matchmaker
+        self.tick = tick
+        self.fill_delay = fill_delay
+        self.engine = engine or OutcomeEngine(max_players=max(matchmaker.required_players + 1, 64))
+        # Bot seats survive restarts through the event log; pick those bots back up
+        self.bots = {player_id for player_id in matchmaker.player_rooms if is_bot(player_id)}
+        self.waiting_since = {}
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                self.fill_seats()
+                self.play_turns()
+                self.dissolve_bot_rooms()
+            except Exception as e:
+                logging.error(f"Bot tick failed: {e}")
+            time.sleep(self.tick)
+
+    def stop(self):
+        self.running = False
+
+    def _add_bot(self, bucket_key):
+        suffix = uuid.uuid4().hex[:6]
+        bot_id = f"{BOT_ID_PREFIX}{suffix}"
+        self.bots.add(bot_id)
+        result = self.matchmaker.join(bot_id, f"Bot {suffix[:4]}", bucket_key=bucket_key)
+        if result.get("status") != "ok":
+            self.bots.discard(bot_id)
+
+    def fill_seats(self):
+        for bucket_key, missing in self.matchmaker.stale_queues(self.fill_delay).items():
+            for _ in range(missing):
+                self._add_bot(bucket_key)
+
+        now = time.monotonic()
+        rooms = self.matchmaker.rooms
+        for room_id, game in list(rooms.items()):
+            free_seats = game.required_players - len(game.players)
+            if game.round_state != "WAITING_FOR_PLAYERS" or free_seats <= 0:
+                self.waiting_since.pop(room_id, None)
+                continue
+            since = self.waiting_since.setdefault(room_id, now)
+            if now - since > self.fill_delay:
+                bucket_key = self.matchmaker.room_buckets.get(room_id, 0)
+                for _ in range(free_seats):
+                    self._add_bot(bucket_key)
+                self.waiting_since.pop(room_id, None)
+        for room_id in list(self.waiting_since):
+            if room_id not in rooms:
+                del self.waiting_since[room_id]
+
+    def _plan_room(self, state):
+        """Returns the bots that raise next in a row and the bot guesser, if the guess follows them."""
+        turn_order = state["turn_order"]
+        if not turn_order or state["active_player_id"] not in self.bots:
+            return [], None
+        guesser_id = turn_order[(state["current_round"] - 1) % len(turn_order)]
+        if state["round_state"] == "WAITING_FOR_GUESSES":
+            return [], guesser_id
+        if state["round_state"] != "WAITING_FOR_NUMBERS":
+            return [], None
+
+        raisers = []
+        for player_id in turn_order[turn_order.index(state["active_player_id"]):]:
+            if player_id not in self.bots:
+                return raisers, None
+            raisers.append(player_id)
+        # Bots raise last, so a bot guesser can guess within the same batch
+        return raisers, guesser_id if guesser_id in self.bots else None
+
+    def play_turns(self):
+        plans = []
+        for game in list(self.matchmaker.rooms.values()):
+            state = game.get_state()
+            raisers, guesser_id = self._plan_room(state)
+            if raisers or guesser_id:
+                plans.append((game, state, raisers, guesser_id))
+        if not plans:
+            return
+
+        numbers = self.engine.choose_raises(sum(len(plan[2]) for plan in plans)).tolist()
+        guessers = []
+        offset = 0
+        for game, state, raisers, guesser_id in plans:
+            raised = dict(zip(raisers, numbers[offset:offset + len(raisers)]))
+            offset += len(raisers)
+            if guesser_id:
+                own_raise = raised.get(guesser_id) or state["players"][guesser_id]["raised_number"] or 1
+                guessers.append((len(state["players"]), own_raise))
+        guesses = iter(self.engine.choose_guesses(np.array([g[0] for g in guessers], dtype=np.int64),
+                                                  np.array([g[1] for g in guessers], dtype=np.int64)).tolist())
+
+        # One batch per room: every bot move of this tick under a single lock acquisition
+        offset = 0
+        for game, state, raisers, guesser_id in plans:
+            ops = [{"op": "action", "player_id": bot_id, "action": "raise_number", "number": number}
+                   for bot_id, number in zip(raisers, numbers[offset:offset + len(raisers)])]
+            offset += len(raisers)
+            if guesser_id:
+                ops.append({"op": "action", "player_id": guesser_id, "action": "make_guess", "guess": next(guesses)})
+            game.run_batch(ops)
+
+    def dissolve_bot_rooms(self):
+        for game in list(self.matchmaker.rooms.values()):
+            player_ids = list(game.players)
+            if player_ids and all(pid in self.bots for pid in player_ids):
+                for bot_id in player_ids:
+                    self.matchmaker.leave(bot_id)
+                    self.bots.discard(bot_id)
@@ -0,0 +1,38 @@
+import gzip
+import zlib
+
+# Bodies smaller than about one packet gain nothing from compression
+COMPRESS_MIN_BYTES = 1024
+SUPPORTED_ENCODINGS = ("gzip", "deflate")
+
+def negotiate_encoding(accept_encoding):
+    """Picks the encoding to use from an Accept-Encoding header, or None for identity."""
+    if not accept_encoding:
+        return None
+    offered = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+    candidates = [(offered[name], name) for name in SUPPORTED_ENCODINGS if offered.get(name, 0) > 0]
+    if not candidates:
+        return None
+    # Highest quality wins; ties go to the first supported encoding (gzip)
+    return max(candidates, key=lambda c: (c[0], -SUPPORTED_ENCODINGS.index(c[1])))[1]
+
+def encode_body(body, encoding):
+    """Returns ``(body, content_encoding)``; bodies below the threshold are left as they are."""
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if encoding == "gzip":
+        # mtime=0 keeps the output identical for identical input, so cached bodies stay comparable
+        return gzip.compress(body, compresslevel=6, mtime=0), "gzip"
+    if encoding == "deflate":
+        return zlib.compress(body, 6), "deflate"
+    return body, None
@@ -0,0 +1,212 @@
+import os
+import json
+import struct
+import zlib
+import threading
+import logging
+
+# Each record: payload length, crc32 of payload, sequence number, then the JSON payload
+RECORD_HEADER = struct.Struct("<IIQ")
+
+class EventLogError(Exception):
+    """The log can no longer make records durable; raised by ``append`` and ``wait_durable``."""
+
+class EventLog:
+    """Append-only log of game events with group commit and snapshots.
+
+    ``append`` only queues the encoded record and returns its sequence
+    number, so callers holding a game lock never wait for the disk. A single
+    writer thread drains everything queued since its last pass, writes it and
+    issues one fsync for the whole batch, whichever rooms the records belong
+    to. ``recover`` loads the latest snapshot plus the events recorded after
+    it so the server can rebuild its rooms on startup.
+
+    If writing ever fails (a full disk, say) the writer stops, ``error`` is
+    set and nothing is acknowledged as durable from then on.
+    """
+
+    def __init__(self, directory, snapshot_every=1000, leaderboard=None):
+        self.directory = directory
+        self.leaderboard = leaderboard
+        self.log_path = os.path.join(directory, "events.log")
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self.snapshot_every = snapshot_every
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.durable_seq = 0
+        self.buffer = []
+        self.cond = threading.Condition()
+        self.file_lock = threading.Lock()
+        self.file = None
+        self.writer = None
+        self.running = False
+        self.error = None
+        self.snapshot_source = None
+        os.makedirs(directory, exist_ok=True)
+
+    def recover(self):
+        """Returns ``(snapshot_rooms, events, leaderboard)`` where events are ``(seq, room_id, type, data)`` tuples.
+
+        ``leaderboard`` is the snapshot's ``Leaderboard.snapshot()``, or None.
+        """
+        rooms = {}
+        leaderboard = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            rooms = snapshot.get("rooms", {})
+            leaderboard = snapshot.get("leaderboard")
+            self.seq = self.snapshot_seq = snapshot.get("seq", 0)
+            for room in rooms.values():
+                self.seq = max(self.seq, room["last_event_seq"])
+
+        events = []
+        good_offset = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "rb") as f:
+                data = f.read()
+            offset = 0
+            while offset + RECORD_HEADER.size <= len(data):
+                length, crc, seq = RECORD_HEADER.unpack_from(data, offset)
+                start = offset + RECORD_HEADER.size
+                payload = data[start:start + length]
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break  # Torn write from a crash, everything after it is garbage
+                record = json.loads(payload)
+                events.append((seq, record["room"], record["type"], record["data"]))
+                self.seq = max(self.seq, seq)
+                offset = good_offset = start + length
+            if good_offset < len(data):
+                logging.warning(f"Event log has {len(data) - good_offset} trailing corrupt bytes, truncating.")
+                with open(self.log_path, "r+b") as f:
+                    f.truncate(good_offset)
+
+        self.durable_seq = self.seq
+        logging.info(f"Recovered {len(rooms)} room snapshot(s) and {len(events)} event(s) from {self.directory}")
+        return rooms, events, leaderboard
+
+    def open(self, snapshot_source=None):
+        """Starts the writer thread. ``snapshot_source`` returns ``{room_id: game}`` for periodic snapshots."""
+        self.snapshot_source = snapshot_source
+        self.file = open(self.log_path, "ab")
+        self.running = True
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer.start()
+
+    def append(self, room_id, event_type, data):
+        payload = json.dumps({"room": room_id, "type": event_type, "data": data}, separators=(",", ":")).encode("utf-8")
+        with self.cond:
+            if self.error is not None:
+                raise EventLogError(f"Event log is not writable: {self.error}")
+            self.seq += 1
+            self.buffer.append(RECORD_HEADER.pack(len(payload), zlib.crc32(payload), self.seq) + payload)
+            self.cond.notify()
+            return self.seq
+
+    def wait_durable(self, seq, timeout=None):
+        """Blocks until the record with ``seq`` has been fsynced. Only for callers that need it."""
+        with self.cond:
+            durable = self.cond.wait_for(lambda: self.durable_seq >= seq or self.error is not None, timeout)
+            if self.durable_seq < seq and self.error is not None:
+                raise EventLogError(f"Event log is not writable: {self.error}")
+            return durable
+
+    def _writer_loop(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.buffer or not self.running)
+                if not self.buffer and not self.running:
+                    return
+                batch, self.buffer = self.buffer, []
+                batch_seq = self.seq
+            try:
+                with self.file_lock:
+                    self.file.write(b"".join(batch))
+                    self.file.flush()
+                    os.fsync(self.file.fileno())
+                with self.cond:
+                    self.durable_seq = batch_seq
+                    self.cond.notify_all()
+
+                if self.snapshot_source and batch_seq - self.snapshot_seq >= self.snapshot_every:
+                    self.write_snapshot(self.snapshot_source())
+            except OSError as e:
+                logging.error(f"Event log write failed, no further events will be persisted: {e}")
+                with self.cond:
+                    self.error = e
+                    self.buffer = []
+                    self.cond.notify_all()
+                return
+
+    def write_snapshot(self, rooms):
+        """Atomically persists the live ``{room_id: game}`` mapping and compacts the log.
+
+        The sequence number is read before the rooms are copied, so a record at or
+        below it is either inside its room's snapshot or belongs to a room that
+        no longer exists.
+        """
+        with self.cond:
+            snapshot_seq = self.seq
+        room_snapshots = {room_id: game.to_snapshot() for room_id, game in list(rooms.items())}
+        snapshot = {"seq": snapshot_seq, "rooms": room_snapshots}
+        if self.leaderboard is not None:
+            # Copied after the rooms, so it covers every round_over that compaction may drop
+            snapshot["leaderboard"] = self.leaderboard.snapshot(since_seq=snapshot_seq)
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self.snapshot_seq = snapshot_seq
+        self._compact(snapshot_seq, room_snapshots)
+        logging.info(f"Wrote snapshot of {len(room_snapshots)} room(s) at seq {snapshot_seq}")
+
+    def _compact(self, snapshot_seq, room_snapshots):
+        # Records appended meanwhile wait in the buffer and land in the new file
+        with self.file_lock:
+            if self.file is None:
+                return
+            self.file.flush()
+            with open(self.log_path, "rb") as f:
+                data = f.read()
+            kept = []
+            offset = 0
+            while offset + RECORD_HEADER.size <= len(data):
+                length, _, seq = RECORD_HEADER.unpack_from(data, offset)
+                start = offset + RECORD_HEADER.size
+                end = start + length
+                if seq > snapshot_seq:
+                    kept.append(data[offset:end])
+                else:
+                    room_id = json.loads(data[start:end])["room"]
+                    if room_id in room_snapshots and seq > room_snapshots[room_id]["last_event_seq"]:
+                        kept.append(data[offset:end])
+                offset = end
+            tmp_path = self.log_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(b"".join(kept))
+                f.flush()
+                os.fsync(f.fileno())
+            self.file.close()
+            os.replace(tmp_path, self.log_path)
+            self.file = open(self.log_path, "ab")
+
+    def checkpoint(self, rooms):
+        """Waits until every queued record is durable, then snapshots; the log stays open."""
+        with self.cond:
+            seq = self.seq
+        self.wait_durable(seq)
+        self.write_snapshot(rooms)
+
+    def close(self, rooms=None):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.writer:
+            self.writer.join()
+        if rooms is not None:
+            self.write_snapshot(rooms)
+        if self.file:
+            self.file.close()
+            self.file = None
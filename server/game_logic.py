@@ -1,9 +1,31 @@
+import json
 import threading
 import logging
+from tracing import tracer
+from compression import encode_body
+
+# Server-side bots get ids with this prefix; client player ids are always "player_..."
+BOT_ID_PREFIX = "bot_"
+
+# "heartbeat" is the version probe's original name; it never tracked liveness
+VERSION_OPS = ("version", "heartbeat")
+
+def is_bot(player_id):
+    return player_id.startswith(BOT_ID_PREFIX)
 
 class NumberGuessGame:
-    def __init__(self, required_players=2):
+    def __init__(self, required_players=2, room_id="main", event_log=None, history=None, leaderboard=None):
         self.required_players = required_players
+        self.room_id = room_id
+        self.event_log = event_log
+        self.history = history
+        self.leaderboard = leaderboard
+        self.state_plane = None
+        self.plane_publish_failed = False
+        # Set while the server hands off to a new process; the snapshot being sent must stay complete
+        self.frozen = False
+        self.last_event_seq = 0
+        self.replaying = False
         self.players = {}
         self.current_round = 0
         self.round_state = "WAITING_FOR_PLAYERS"
@@ -13,19 +35,85 @@ class NumberGuessGame:
         self.turn_order = []
         self.current_turn_index = 0
         self.player_usernames = {}
+        self.version = 0
+        # Serialized state of one version: {encoding: (body, content_encoding)}, identity under None
+        self._encoded_version = None
+        self._encoded_bodies = {}
 
     def _get_current_player_id(self):
         if not self.turn_order or self.current_turn_index >= len(self.turn_order):
             return None
         return self.turn_order[self.current_turn_index]
 
+    def _log_failed(self):
+        return self.event_log is not None and self.event_log.error is not None and not self.replaying
+
+    def _refusal(self):
+        """The error result for a change this room cannot accept right now, or None."""
+        if self.frozen:
+            return {"status": "error", "message": "The server is restarting. Try again in a moment."}
+        if self._log_failed():
+            return {"status": "error", "message": "Game changes cannot be saved right now. Try again later."}
+        return None
+
+    def freeze(self, frozen=True):
+        """Refuses (or again accepts) joins and actions; waits for the change in progress, if any."""
+        with self.lock:
+            self.frozen = frozen
+
+    def _record(self, event_type, **data):
+        if self.event_log and not self.replaying:
+            self.last_event_seq = self.event_log.append(self.room_id, event_type, data)
+
+    def _publish_state(self):
+        if self.state_plane is None:
+            return
+        if self.players:
+            if self.state_plane.publish(self.room_id, self.version, self._encoded_state(None)[0]):
+                self.plane_publish_failed = False
+                return
+            if not self.plane_publish_failed:
+                logging.warning(f"Room {self.room_id} state does not fit the state plane; "
+                                f"read workers answer 404 so clients poll the main port")
+            self.plane_publish_failed = True
+        # An unpublished room must not keep serving its last published version
+        self.state_plane.release(self.room_id)
+
+    def publish_state(self):
+        with self.lock:
+            self._publish_state()
+
+    def _encoded_state(self, encoding):
+        if self._encoded_version != self.version:
+            with tracer.span("serialize"):
+                plain = json.dumps(self._build_state()).encode('utf-8')
+            self._encoded_version = self.version
+            self._encoded_bodies = {None: (plain, None)}
+        if encoding not in self._encoded_bodies:
+            with tracer.span("serialize"):
+                self._encoded_bodies[encoding] = encode_body(self._encoded_bodies[None][0], encoding)
+        return self._encoded_bodies[encoding]
+
+    def encoded_state(self, encoding=None):
+        """Returns ``(body, content_encoding)`` for the current state.
+
+        The JSON body and each compressed variant are built once per state
+        version and shared by every poll until the version changes.
+        """
+        with tracer.locked(self.lock):
+            return self._encoded_state(encoding)
+
     def _update_round_state(self, new_state, message=""):
         self.round_state = new_state
         self.round_message = message
+        self.version += 1
         logging.info(f"Game State Updated: {self.round_state} - {self.round_message}")
 
     def add_player(self, player_id, username=None):
-        with self.lock:
+        with tracer.locked(self.lock):
+            refusal = self._refusal()
+            if refusal:
+                return refusal
             if username in self.player_usernames.values():
                 return {"status": "error", "message": "Username is already taken."}
             if player_id in self.players:
@@ -38,6 +126,7 @@ class NumberGuessGame:
                 self.turn_order.append(player_id)
             if username:
                 self.player_usernames[player_id] = username
+            self._record("join", player_id=player_id, username=username)
             
             logging.info(f"Player {player_id} ({username}) joined. Total players: {len(self.players)}/{self.required_players}.")
             
@@ -46,10 +135,12 @@ class NumberGuessGame:
             else:
                 remaining = self.required_players - len(self.players)
                 self.round_message = f"Welcome {username or player_id}! Waiting for {remaining} more player(s)."
+                self.version += 1
+            self._publish_state()
             return {"status": "ok"}
 
     def remove_player(self, player_id):
-        with self.lock:
+        with tracer.locked(self.lock):
             if player_id not in self.players:
                 return False
             
@@ -61,6 +152,9 @@ class NumberGuessGame:
                 self.turn_order.remove(player_id)
             if player_id in self.player_usernames:
                 del self.player_usernames[player_id]
+            if not self._log_failed():
+                # Nothing is persisted any more, but leaving must still free the seat
+                self._record("leave", player_id=player_id)
             
             logging.info(f"Player {username} (ID: {player_id}) left. Total players: {len(self.players)}")
             
@@ -71,6 +165,8 @@ class NumberGuessGame:
                     self.players[pid] = {'score': 0, 'raised_number': None, 'guess': None}
             elif was_current_turn:
                 self._check_for_state_transition()
+            self.version += 1
+            self._publish_state()
             return True
 
     def start_new_round(self):
@@ -89,53 +185,136 @@ class NumberGuessGame:
         logging.info(f"--- Starting Round {self.current_round} ---")
 
     def handle_action(self, player_id, action_data):
-        with self.lock:
-            action = action_data.get("action")
-            username = self.player_usernames.get(player_id, player_id)
-            
-            if self.round_state == "WAITING_FOR_NUMBERS":
-                self._handle_raise_action(player_id, action, action_data.get("number"))
-            
-            elif self.round_state == "WAITING_FOR_GUESSES":
-                self._handle_guess_action(player_id, username, action, action_data.get("guess"))
+        with tracer.locked(self.lock):
+            result = self._handle_action(player_id, action_data)
+            if result["status"] == "ok":
+                self._publish_state()
+            result["state"] = self._build_state()
+            return result
 
-            elif action == "start_new_round" and self.round_state == "ROUND_OVER":
-                self.start_new_round()
+    def run_batch(self, ops):
+        """Executes ``ops`` in order under a single acquisition of the room lock.
 
-    def _handle_raise_action(self, player_id, action, number):
-        if player_id != self._get_current_player_id() or action != "raise_number":
-            return
+        Each op is a dict with ``op`` ("action", "state" or "version") and
+        the acting ``player_id``; actions carry the same fields as
+        ``handle_action``. A state op with ``since`` only returns the state if
+        it is newer than that version. A version op only reports the current
+        version and whether the player is still seated; it records nothing and
+        does not keep the player connected, since players only leave through
+        ``/disconnect``. "heartbeat" is accepted as its old name. Returns one
+        result dict per op.
+        """
+        results = []
+        changed = False
+        with tracer.locked(self.lock):
+            for op in ops:
+                kind = op.get("op")
+                player_id = op.get("player_id")
+                if kind == "action":
+                    result = self._handle_action(player_id, op)
+                    changed = changed or result["status"] == "ok"
+                elif kind == "state":
+                    since = op.get("since")
+                    if isinstance(since, int) and self.version <= since:
+                        result = {"status": "not_modified", "version": self.version}
+                    else:
+                        result = {"status": "ok", "state": self._build_state()}
+                elif kind in VERSION_OPS:
+                    if player_id in self.players:
+                        result = {"status": "ok", "version": self.version}
+                    else:
+                        result = {"status": "error", "message": "Player is not in this room."}
+                else:
+                    result = {"status": "error", "message": f"Unknown operation {kind!r}."}
+                results.append(result)
+            if changed:
+                self._publish_state()
+        return results
+
+    def _handle_action(self, player_id, action_data):
+        refusal = self._refusal()
+        if refusal:
+            return refusal
+        action = action_data.get("action")
+        username = self.player_usernames.get(player_id, player_id)
         
-        if number in [1, 2] and self.players[player_id]['raised_number'] is None:
-            self.players[player_id]['raised_number'] = number
-            username = self.player_usernames.get(player_id, player_id)
-            logging.info(f"Player {username} (ID: {player_id}) raised: {number}")
-            self.current_turn_index += 1
-            self._check_for_state_transition()
+        if self.round_state == "WAITING_FOR_NUMBERS":
+            result = self._handle_raise_action(player_id, action, action_data.get("number"))
+        
+        elif self.round_state == "WAITING_FOR_GUESSES":
+            result = self._handle_guess_action(player_id, username, action, action_data.get("guess"))
+
+        elif action == "start_new_round" and self.round_state == "ROUND_OVER":
+            self._record("start_round", player_id=player_id)
+            self.start_new_round()
+            result = {"status": "ok"}
+
+        elif self.round_state == "WAITING_FOR_PLAYERS":
+            result = {"status": "error", "message": "Waiting for players to join."}
+
+        else:
+            result = {"status": "error", "message": f"Action '{action}' is not allowed right now."}
+
+        if result["status"] == "error":
+            logging.info(f"Rejected action {action!r} from {username}: {result['message']}")
+        return result
+
+    def _handle_raise_action(self, player_id, action, number):
+        if action != "raise_number":
+            return {"status": "error", "message": f"Action '{action}' is not allowed while numbers are being raised."}
+        if player_id != self._get_current_player_id():
+            return {"status": "error", "message": "It is not your turn to raise."}
+        if number not in [1, 2]:
+            return {"status": "error", "message": "You can only raise 1 or 2."}
+        if self.players[player_id]['raised_number'] is not None:
+            return {"status": "error", "message": "You have already raised a number."}
+
+        self.players[player_id]['raised_number'] = number
+        self._record("raise", player_id=player_id, number=number)
+        username = self.player_usernames.get(player_id, player_id)
+        logging.info(f"Player {username} (ID: {player_id}) raised: {number}")
+        self.current_turn_index += 1
+        self._check_for_state_transition()
+        return {"status": "ok"}
 
     def _handle_guess_action(self, player_id, username, action, guess):
-        if not self.turn_order: return
+        if not self.turn_order:
+            return {"status": "error", "message": "No players in the game."}
         designated_guesser_index = (self.current_round - 1) % len(self.turn_order)
         designated_guesser_id = self.turn_order[designated_guesser_index]
         
-        if player_id != designated_guesser_id or action != "make_guess":
-            return
+        if action != "make_guess":
+            return {"status": "error", "message": f"Action '{action}' is not allowed while waiting for a guess."}
+        if player_id != designated_guesser_id:
+            return {"status": "error", "message": "You are not the guesser this round."}
         
         min_guess, max_guess = len(self.players), len(self.players) * 2
         if not (isinstance(guess, int) and min_guess <= guess <= max_guess):
-            return
+            return {"status": "error", "message": f"Guess must be a number between {min_guess} and {max_guess}."}
 
         self.players[player_id]['guess'] = guess
+        self._record("guess", player_id=player_id, guess=guess)
         logging.info(f"Player {username} (ID: {player_id}) submitted guess: {guess}")
         
-        if guess == self.actual_total:
+        won = guess == self.actual_total
+        if won:
             self.players[player_id]['score'] += 1
             result_message = f"Round {self.current_round} Over! {username} guessed correctly ({guess}) and wins!"
         else:
             result_message = f"Round {self.current_round} Over! {username} guessed {guess}, but the total was {self.actual_total}."
+        self._record("round_over", round=self.current_round, actual_total=self.actual_total,
+                     winner=player_id if won else None, player_id=player_id, username=username)
+        # During replay the server feeds logged round_over events to the leaderboard itself
+        if self.leaderboard is not None and not self.replaying and not is_bot(player_id):
+            self.leaderboard.record_guess(username, won, seq=self.last_event_seq if self.event_log else None)
+        if self.history and not self.replaying:
+            raised = [(pid, self.players[pid]['raised_number']) for pid in self.turn_order]
+            self.history.append_round(self.room_id, self.current_round, raised, player_id, guess,
+                                      self.actual_total, player_id if won else None)
         
         self._update_round_state("ROUND_OVER", result_message)
         logging.info(result_message)
+        return {"status": "ok"}
 
     def _check_for_state_transition(self):
         if self.round_state == "WAITING_FOR_NUMBERS":
@@ -156,32 +335,39 @@ class NumberGuessGame:
                 self._update_round_state("WAITING_FOR_NUMBERS", f"Waiting for {next_username} to raise a number.")
                 
     def get_state(self):
-        with self.lock:
-            active_player_id = None
-            if self.round_state == 'WAITING_FOR_NUMBERS':
-                active_player_id = self._get_current_player_id()
-            elif self.round_state == 'WAITING_FOR_GUESSES':
-                if not self.turn_order:
-                    return self.get_default_state()
-                designated_guesser_index = (self.current_round - 1) % len(self.turn_order)
-                active_player_id = self.turn_order[designated_guesser_index]
-            
-            display_players = {pid: data.copy() for pid, data in self.players.items()}
-            
-            return {
-                "current_round": self.current_round,
-                "round_state": self.round_state,
-                "round_message": self.round_message,
-                "players": display_players,
-                "actual_total": self.actual_total if self.round_state == "ROUND_OVER" else None,
-                "required_players": self.required_players,
-                "active_player_id": active_player_id,
-                "player_usernames": self.player_usernames,
-                "turn_order": self.turn_order,
-            }
+        with tracer.locked(self.lock):
+            return self._build_state()
+
+    def _build_state(self):
+        active_player_id = None
+        if self.round_state == 'WAITING_FOR_NUMBERS':
+            active_player_id = self._get_current_player_id()
+        elif self.round_state == 'WAITING_FOR_GUESSES':
+            if not self.turn_order:
+                return self.get_default_state()
+            designated_guesser_index = (self.current_round - 1) % len(self.turn_order)
+            active_player_id = self.turn_order[designated_guesser_index]
+        
+        display_players = {pid: data.copy() for pid, data in self.players.items()}
+        
+        return {
+            "version": self.version,
+            "room_id": self.room_id,
+            "current_round": self.current_round,
+            "round_state": self.round_state,
+            "round_message": self.round_message,
+            "players": display_players,
+            "actual_total": self.actual_total if self.round_state == "ROUND_OVER" else None,
+            "required_players": self.required_players,
+            "active_player_id": active_player_id,
+            "player_usernames": dict(self.player_usernames),
+            "turn_order": list(self.turn_order),
+        }
 
     def get_default_state(self):
         return {
+            "version": self.version,
+            "room_id": self.room_id,
             "current_round": 0,
             "round_state": "WAITING_FOR_PLAYERS",
             "round_message": "Waiting for players...",
@@ -193,3 +379,53 @@ class NumberGuessGame:
             "turn_order": [],
         }
 
+    def apply_event(self, event_type, data):
+        """Re-applies a recorded event during recovery without logging it again."""
+        self.replaying = True
+        try:
+            if event_type == "join":
+                self.add_player(data["player_id"], data.get("username"))
+            elif event_type == "leave":
+                self.remove_player(data["player_id"])
+            elif event_type == "raise":
+                self.handle_action(data["player_id"], {"action": "raise_number", "number": data["number"]})
+            elif event_type == "guess":
+                self.handle_action(data["player_id"], {"action": "make_guess", "guess": data["guess"]})
+            elif event_type == "start_round":
+                self.handle_action(data["player_id"], {"action": "start_new_round"})
+            # round_over is derived from the guess and only kept for readers of the log
+        finally:
+            self.replaying = False
+
+    def to_snapshot(self):
+        with self.lock:
+            return {
+                "room_id": self.room_id,
+                "required_players": self.required_players,
+                "players": {pid: data.copy() for pid, data in self.players.items()},
+                "current_round": self.current_round,
+                "round_state": self.round_state,
+                "round_message": self.round_message,
+                "actual_total": self.actual_total,
+                "turn_order": list(self.turn_order),
+                "current_turn_index": self.current_turn_index,
+                "player_usernames": dict(self.player_usernames),
+                "version": self.version,
+                "last_event_seq": self.last_event_seq,
+            }
+
+    @classmethod
+    def from_snapshot(cls, snapshot, event_log=None, history=None, leaderboard=None):
+        game = cls(required_players=snapshot["required_players"], room_id=snapshot["room_id"],
+                   event_log=event_log, history=history, leaderboard=leaderboard)
+        game.players = {pid: data.copy() for pid, data in snapshot["players"].items()}
+        game.current_round = snapshot["current_round"]
+        game.round_state = snapshot["round_state"]
+        game.round_message = snapshot["round_message"]
+        game.actual_total = snapshot["actual_total"]
+        game.turn_order = list(snapshot["turn_order"])
+        game.current_turn_index = snapshot["current_turn_index"]
+        game.player_usernames = dict(snapshot["player_usernames"])
+        game.version = snapshot["version"]
+        game.last_event_seq = snapshot["last_event_seq"]
+        return game
@@ -0,0 +1,127 @@
+import os
+import json
+import signal
+import socket
+import struct
+import threading
+import zlib
+import logging
+
+TAKEOVER_REQUEST = b"TAKEOVER\n"
+TAKEOVER_ACK = b"OK"
+LENGTH = struct.Struct("<Q")
+# pid, uid, gid of the process on the other end of a Unix socket
+PEER_CREDENTIALS = struct.Struct("3i")
+
+def encode_snapshot(snapshot):
+    return zlib.compress(json.dumps(snapshot, separators=(",", ":")).encode("utf-8"))
+
+def decode_snapshot(payload):
+    return json.loads(zlib.decompress(payload))
+
+class HandoffListener(threading.Thread):
+    """Waits on a Unix socket for a new server process asking to take over.
+
+    ``on_request`` receives the connected Unix socket and is responsible for
+    draining, sending the listening socket and snapshot with ``send_handoff``,
+    and closing the connection.
+    """
+
+    def __init__(self, path, on_request):
+        super().__init__(daemon=True)
+        self.path = path
+        self.on_request = on_request
+        if os.path.exists(path):
+            os.unlink(path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen(1)
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            if conn.recv(len(TAKEOVER_REQUEST)) != TAKEOVER_REQUEST:
+                conn.close()
+                continue
+            logging.info(f"Takeover requested on {self.path}")
+            self.close()
+            self.on_request(conn)
+            return
+
+    def close(self):
+        self.sock.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def _peer_pid(conn):
+    try:
+        creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, PEER_CREDENTIALS.size)
+    except (AttributeError, OSError):
+        return None
+    return PEER_CREDENTIALS.unpack(creds)[0]
+
+def _fence(pid):
+    """Kills a process that may hold the listening socket; returns False if it may still be running."""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        return True
+    except OSError as e:
+        logging.error(f"Could not stop unconfirmed new process {pid}: {e}")
+        return False
+    logging.warning(f"Killed new process {pid}, it received the listening socket but never confirmed")
+    return True
+
+def send_handoff(conn, listen_socket, snapshot, timeout=30.0):
+    """Passes the listening socket fd and the encoded snapshot, then waits for the ack.
+
+    Returns False when the caller is again the only owner of the socket and
+    must keep serving: the fd never left, or the process that got it without
+    acking has been killed. Returns True when the new process owns it, which
+    includes the case where it could not be killed; two processes must never
+    accept on the same socket with diverging rooms.
+    """
+    payload = encode_snapshot(snapshot)
+    pid = _peer_pid(conn)
+    sent = acked = False
+    try:
+        conn.settimeout(timeout)
+        socket.send_fds(conn, [LENGTH.pack(len(payload))], [listen_socket.fileno()])
+        sent = True
+        conn.sendall(payload)
+        acked = conn.recv(len(TAKEOVER_ACK)) == TAKEOVER_ACK
+    except OSError as e:
+        logging.warning(f"Handoff to the new process failed: {e}")
+    finally:
+        conn.close()
+    logging.info(f"Handed off listening socket and {len(payload)}-byte snapshot (acked: {acked})")
+    if acked or not sent:
+        return acked
+    return not _fence(pid)
+
+
+def request_takeover(path, timeout=60.0):
+    """Asks the running server at ``path`` to hand over; returns ``(listen_socket, snapshot)``."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(timeout)
+        conn.connect(path)
+        conn.sendall(TAKEOVER_REQUEST)
+        header, fds, _, _ = socket.recv_fds(conn, LENGTH.size, 1)
+        if len(header) != LENGTH.size or not fds:
+            raise ConnectionError("Old server did not send a listening socket")
+        length = LENGTH.unpack(header)[0]
+        payload = b""
+        while len(payload) < length:
+            chunk = conn.recv(length - len(payload))
+            if not chunk:
+                raise ConnectionError("Old server closed the handoff before sending the snapshot")
+            payload += chunk
+        conn.sendall(TAKEOVER_ACK)
+    listen_socket = socket.socket(fileno=fds[0])
+    return listen_socket, decode_snapshot(payload)
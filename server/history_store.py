@@ -0,0 +1,169 @@
+import os
+import mmap
+import struct
+import time
+import threading
+import logging
+from array import array
+from bisect import bisect_left
+from itertools import islice
+
+MAGIC = b"JPHIST01"
+# magic, record size, record count; padded so records start on a 64-byte boundary
+FILE_HEADER = struct.Struct("<8sIQ")
+HEADER_SIZE = 64
+MAX_SLOTS = 16
+# room_id, round, timestamp, actual total, guess, player count, guesser slot, winner slot,
+# then (player_id, raised number) for each of MAX_SLOTS seats in turn order
+RECORD = struct.Struct("<24sIdHHBBb" + "16sB" * MAX_SLOTS)
+GROW_RECORDS = 4096
+
+def _common_from_end(a, b):
+    """Yields record numbers present in both ascending indexes, newest first, without copying either."""
+    i, j = len(a) - 1, len(b) - 1
+    while i >= 0 and j >= 0:
+        if a[i] == b[j]:
+            yield a[i]
+            i -= 1
+            j -= 1
+        elif a[i] > b[j]:
+            i -= 1
+        else:
+            j -= 1
+
+def _count_common(a, b):
+    """Size of the intersection of two ascending indexes: binary searches of the larger for each of the smaller."""
+    small, large = (a, b) if len(a) <= len(b) else (b, a)
+    count = 0
+    for record_no in small:
+        k = bisect_left(large, record_no)
+        if k < len(large) and large[k] == record_no:
+            count += 1
+    return count
+
+class HistoryStore:
+    """Fixed-size round records in a memory-mapped file.
+
+    Records are appended in completion order and never rewritten, so record
+    number doubles as a stable offset. Per-room and per-player indexes map to
+    record numbers (4 bytes each) and are rebuilt by one scan on open; a query
+    only decodes the page of records it returns. Rooms larger than MAX_SLOTS
+    players keep the first MAX_SLOTS seats.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.room_index = {}
+        self.player_index = {}
+        self.count = 0
+
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE
+        self.file = open(path, "r+b" if exists else "w+b")
+        if not exists:
+            self.file.truncate(HEADER_SIZE + RECORD.size * GROW_RECORDS)
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+        if exists:
+            magic, record_size, self.count = FILE_HEADER.unpack_from(self.mm, 0)
+            if magic != MAGIC or record_size != RECORD.size:
+                raise ValueError(f"{path} is not a round history file with {RECORD.size}-byte records")
+            self._build_indexes()
+        else:
+            self._write_header()
+        logging.info(f"Round history at {path} holds {self.count} round(s)")
+
+    def _write_header(self):
+        FILE_HEADER.pack_into(self.mm, 0, MAGIC, RECORD.size, self.count)
+
+    def _build_indexes(self):
+        for record_no in range(self.count):
+            fields = RECORD.unpack_from(self.mm, HEADER_SIZE + record_no * RECORD.size)
+            self._index(record_no, fields[0].rstrip(b"\0").decode(), self._player_ids(fields))
+
+    @staticmethod
+    def _player_ids(fields):
+        num_players = min(fields[5], MAX_SLOTS)
+        return [fields[8 + 2 * i].rstrip(b"\0").decode() for i in range(num_players)]
+
+    def _index(self, record_no, room_id, player_ids):
+        self.room_index.setdefault(room_id, array("I")).append(record_no)
+        for player_id in player_ids:
+            self.player_index.setdefault(player_id, array("I")).append(record_no)
+
+    def append_round(self, room_id, round_number, raised, guesser_id, guess, actual_total, winner_id):
+        """Stores one completed round. ``raised`` is a list of ``(player_id, number)`` in turn order."""
+        seats = raised[:MAX_SLOTS]
+        player_ids = [pid for pid, _ in seats]
+        slot_values = []
+        for player_id, number in seats:
+            slot_values += [player_id.encode()[:16], number or 0]
+        slot_values += [b"", 0] * (MAX_SLOTS - len(seats))
+        guesser_slot = player_ids.index(guesser_id) if guesser_id in player_ids else 255
+        winner_slot = player_ids.index(winner_id) if winner_id in player_ids else -1
+        packed = RECORD.pack(room_id.encode()[:24], round_number, time.time(), actual_total,
+                             guess or 0, len(seats), guesser_slot, winner_slot, *slot_values)
+
+        with self.lock:
+            offset = HEADER_SIZE + self.count * RECORD.size
+            if offset + RECORD.size > len(self.mm):
+                self._grow()
+            self.mm[offset:offset + RECORD.size] = packed
+            self._index(self.count, room_id, player_ids)
+            self.count += 1
+            self._write_header()
+
+    def _grow(self):
+        new_size = len(self.mm) + RECORD.size * max(GROW_RECORDS, self.count // 2)
+        self.mm.close()
+        self.file.truncate(new_size)
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+
+    def _decode(self, record_no):
+        fields = RECORD.unpack_from(self.mm, HEADER_SIZE + record_no * RECORD.size)
+        room_id, round_number, timestamp, actual_total, guess, num_players, guesser_slot, winner_slot = fields[:8]
+        player_ids = self._player_ids(fields)
+        raised = {player_ids[i]: fields[9 + 2 * i] for i in range(len(player_ids))}
+        return {
+            "record": record_no,
+            "room_id": room_id.rstrip(b"\0").decode(),
+            "round": round_number,
+            "timestamp": timestamp,
+            "raised_numbers": raised,
+            "turn_order": player_ids,
+            "guesser": player_ids[guesser_slot] if guesser_slot < len(player_ids) else None,
+            "guess": guess,
+            "actual_total": actual_total,
+            "winner": player_ids[winner_slot] if 0 <= winner_slot < len(player_ids) else None,
+        }
+
+    def query(self, room_id=None, player_id=None, offset=0, limit=20):
+        """Returns ``(total, rounds)`` for one page, newest round first."""
+        with self.lock:
+            if player_id is not None and room_id is not None:
+                player_records = self.player_index.get(player_id, array("I"))
+                room_records = self.room_index.get(room_id, array("I"))
+                total = _count_common(player_records, room_records)
+                page_nos = islice(_common_from_end(player_records, room_records), offset, offset + limit)
+                return total, [self._decode(n) for n in page_nos]
+            if player_id is not None:
+                record_nos = self.player_index.get(player_id, array("I"))
+            elif room_id is not None:
+                record_nos = self.room_index.get(room_id, array("I"))
+            else:
+                record_nos = range(self.count)
+
+            total = len(record_nos)
+            end = max(total - offset, 0)
+            start = max(end - limit, 0)
+            page = [self._decode(record_nos[i]) for i in range(end - 1, start - 1, -1)]
+            return total, page
+
+    def flush(self):
+        with self.lock:
+            self.mm.flush()
+
+    def close(self):
+        with self.lock:
+            self.mm.flush()
+            self.mm.close()
+            self.file.close()
@@ -1,13 +1,41 @@
 import json
 import uuid
+import threading
 from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+from tracing import tracer, profiler
+from compression import negotiate_encoding, encode_body
+from game_logic import VERSION_OPS
+
+MAX_BATCH_OPS = 32
 
 class HttpServer:
-    def __init__(self, game_instance):
-        self.game = game_instance
+    def __init__(self, matchmaker, history=None, leaderboard=None, admin_token=None):
+        self.matchmaker = matchmaker
+        self.history = history
+        self.leaderboard = leaderboard
+        # /debug endpoints are only served when a token is configured
+        self.admin_token = admin_token
         self.sessions = {}
+        # The encoding negotiated for the request the current thread is answering
+        self.request_local = threading.local()
 
     def response(self, kode=404, message='Not Found', messagebody='', headers={}):
+        with tracer.span("serialize"):
+            body_bytes = json.dumps(messagebody).encode('utf-8')
+        return self.raw_response(kode, message, body_bytes, headers)
+
+    def raw_response(self, kode, message, body_bytes, headers={}, compress=True):
+        """Builds a response around an already serialized JSON body.
+
+        Bodies above the size threshold are compressed with the encoding the
+        client accepted, unless ``compress`` is False.
+        """
+        encoding = getattr(self.request_local, 'encoding', None)
+        if compress and encoding:
+            body_bytes, content_encoding = encode_body(body_bytes, encoding)
+            if content_encoding:
+                headers = {**headers, 'Content-Encoding': content_encoding, 'Vary': 'Accept-Encoding'}
         tanggal = datetime.now().strftime('%c')
         resp = []
         resp.append(f"HTTP/1.1 {kode} {message}\r\n")
@@ -15,8 +43,6 @@ class HttpServer:
         resp.append("Connection: close\r\n")
         resp.append("Server: JempolServer/1.0\r\n")
         resp.append("Content-Type: application/json\r\n")
-        
-        body_bytes = json.dumps(messagebody).encode('utf-8')
         resp.append(f"Content-Length: {len(body_bytes)}\r\n")
         
         for kk, vv in headers.items():
@@ -26,28 +52,42 @@ class HttpServer:
         response_headers = "".join(resp)
         return response_headers.encode('utf-8') + body_bytes
 
+    def encoded_response(self, body_bytes, content_encoding, headers={}):
+        """200 response for a body that was serialized, and possibly compressed, ahead of time."""
+        if content_encoding:
+            headers = {**headers, 'Content-Encoding': content_encoding, 'Vary': 'Accept-Encoding'}
+        # Left plain means below the threshold or not accepted; do not try again per request
+        return self.raw_response(200, 'OK', body_bytes, headers, compress=False)
+
     def proses(self, data):
-        requests = data.split("\r\n")
-        baris = requests[0]
-        
-        all_headers_list = [n for n in requests[1:] if n]
-        all_headers = {}
-        content_length = 0
-        for header in all_headers_list:
-            if ':' in header:
-                key, value = header.split(':', 1)
-                all_headers[key.strip()] = value.strip()
-                if key.lower() == 'content-length':
-                    content_length = int(value.strip())
-
-        body_str = ""
-        if '\r\n\r\n' in data:
-            body_str = data.split('\r\n\r\n', 1)[1]
+        with tracer.span("parse"):
+            requests = data.split("\r\n")
+            baris = requests[0]
+
+            all_headers_list = [n for n in requests[1:] if n]
+            all_headers = {}
+            content_length = 0
+            for header in all_headers_list:
+                if ':' in header:
+                    key, value = header.split(':', 1)
+                    all_headers[key.strip()] = value.strip()
+                    if key.lower() == 'content-length':
+                        content_length = int(value.strip())
+
+            body_str = ""
+            if '\r\n\r\n' in data:
+                body_str = data.split('\r\n\r\n', 1)[1]
+
+            accept_encoding = next((v for k, v in all_headers.items() if k.lower() == 'accept-encoding'), None)
+            self.request_local.encoding = negotiate_encoding(accept_encoding)
 
         j = baris.split(" ")
         try:
             method = j[0].upper().strip()
             object_address = j[1].strip()
+            tracer.annotate(method=method, path=object_address)
+            if object_address.startswith('/debug/'):
+                return self.http_debug(method, object_address, all_headers, body_str)
 
             if method == 'GET':
                 return self.http_get(object_address, all_headers)
@@ -59,16 +99,129 @@ class HttpServer:
             return self.response(400, 'Bad Request', {'error': 'Malformed request line'})
 
     def http_get(self, object_address, headers):
-        if object_address == '/gamestate':
+        url = urlsplit(object_address)
+        path = url.path
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if path == '/gamestate':
             player_id = headers.get("X-Player-ID")
             if not player_id:
                 return self.response(400, 'Bad Request', {'error': 'X-Player-ID header is required'})
             
-            state = self.game.get_state()
+            game = self.matchmaker.room_for(player_id)
+            if game is not None:
+                return self.encoded_response(*game.encoded_state(self.request_local.encoding))
+            state = self.matchmaker.get_state(player_id)
+            if state is None:
+                return self.response(404, 'Not Found', {'error': 'Player not found in game.'})
             return self.response(200, 'OK', state)
+        elif path == '/history':
+            return self.http_get_history(query)
+        elif path == '/leaderboard':
+            return self.http_get_leaderboard(query)
         else:
             return self.response(404, 'Not Found', {'error': f'Endpoint {object_address} not found'})
 
+    def http_debug(self, method, object_address, headers, body_str):
+        """Admin-only diagnostics: the trace ring buffer and the sampling profiler."""
+        if not self.admin_token:
+            return self.response(404, 'Not Found', {'error': f'Endpoint {object_address} not found'})
+        if headers.get("X-Admin-Token") != self.admin_token:
+            return self.response(403, 'Forbidden', {'error': 'A valid X-Admin-Token header is required'})
+
+        url = urlsplit(object_address)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            payload = json.loads(body_str) if body_str else {}
+        except json.JSONDecodeError:
+            return self.response(400, 'Bad Request', {'error': 'Invalid JSON in request body'})
+
+        if url.path == '/debug/traces' and method == 'GET':
+            try:
+                limit = min(max(int(query.get('limit', 100)), 1), tracer.traces.maxlen)
+            except ValueError:
+                return self.response(400, 'Bad Request', {'error': 'limit must be an integer'})
+            return self.response(200, 'OK', {'enabled': tracer.enabled, 'capacity': tracer.traces.maxlen,
+                                             'traces': tracer.recent(limit)})
+        elif url.path == '/debug/traces' and method == 'POST':
+            tracer.enabled = bool(payload.get('enabled', True))
+            return self.response(200, 'OK', {'enabled': tracer.enabled})
+        elif url.path == '/debug/profile' and method == 'POST':
+            try:
+                seconds = min(max(float(payload.get('seconds', 5)), 0.1), 60.0)
+                interval = min(max(float(payload.get('interval_ms', 5)), 1.0), 1000.0) / 1000
+            except (TypeError, ValueError):
+                return self.response(400, 'Bad Request', {'error': 'seconds and interval_ms must be numbers'})
+            result = profiler.profile(seconds, interval)
+            if result is None:
+                return self.response(409, 'Conflict', {'error': 'A profile is already running'})
+            return self.response(200, 'OK', result)
+        else:
+            return self.response(404, 'Not Found', {'error': f'Endpoint {object_address} not found'})
+
+    def http_post_batch(self, headers, payload):
+        """Runs several operations for one player in one round trip and one room lock acquisition."""
+        player_id = headers.get("X-Player-ID")
+        if not player_id:
+            return self.response(401, 'Unauthorized', {'error': 'X-Player-ID header is required'})
+        ops = payload.get("ops")
+        if not isinstance(ops, list) or not all(isinstance(op, dict) for op in ops):
+            return self.response(400, 'Bad Request', {'error': 'ops must be a list of operation objects'})
+        if len(ops) > MAX_BATCH_OPS:
+            return self.response(400, 'Bad Request', {'error': f'A batch holds at most {MAX_BATCH_OPS} operations'})
+
+        game = self.matchmaker.room_for(player_id)
+        if game is not None:
+            # The header decides who acts; ops cannot act for other players
+            results = game.run_batch([dict(op, player_id=player_id) for op in ops])
+            return self.response(200, 'OK', {'results': results})
+        if not self.matchmaker.is_queued(player_id):
+            return self.response(404, 'Not Found', {'error': 'Player not found in game.'})
+
+        results = []
+        for op in ops:
+            if op.get("op") == "state":
+                results.append({"status": "ok", "state": self.matchmaker.get_state(player_id)})
+            elif op.get("op") in VERSION_OPS:
+                results.append({"status": "ok", "version": self.matchmaker.get_state(player_id)["version"]})
+            else:
+                results.append({"status": "error", "message": "Still waiting for a table."})
+        return self.response(200, 'OK', {'results': results})
+
+    def http_get_history(self, query):
+        if self.history is None:
+            return self.response(404, 'Not Found', {'error': 'Round history is not enabled'})
+        try:
+            offset = max(int(query.get('offset', 0)), 0)
+            limit = min(max(int(query.get('limit', 20)), 1), 100)
+        except ValueError:
+            return self.response(400, 'Bad Request', {'error': 'offset and limit must be integers'})
+
+        total, rounds = self.history.query(room_id=query.get('room_id'), player_id=query.get('player_id'),
+                                           offset=offset, limit=limit)
+        return self.response(200, 'OK', {'total': total, 'offset': offset, 'limit': limit, 'rounds': rounds})
+
+    def http_get_leaderboard(self, query):
+        if self.leaderboard is None:
+            return self.response(404, 'Not Found', {'error': 'Leaderboard is not enabled'})
+
+        username = query.get('username')
+        if username:
+            entry = self.leaderboard.player_rank(username)
+            if entry is None:
+                return self.response(404, 'Not Found', {'error': f'Player {username} has no ranked rounds'})
+            return self.response(200, 'OK', entry)
+
+        by = query.get('by', 'score')
+        if by not in ('score', 'win_rate'):
+            return self.response(400, 'Bad Request', {'error': "by must be 'score' or 'win_rate'"})
+        try:
+            limit = min(max(int(query.get('limit', 10)), 1), 100)
+        except ValueError:
+            return self.response(400, 'Bad Request', {'error': 'limit must be an integer'})
+        return self.response(200, 'OK', {'by': by, 'players': len(self.leaderboard),
+                                         'top': self.leaderboard.top(limit, by=by)})
+
     def http_post(self, object_address, headers, body_str):
         try:
             payload = json.loads(body_str) if body_str else {}
@@ -82,28 +235,47 @@ class HttpServer:
             
             player_id = f"player_{uuid.uuid4().hex[:6]}"
             
-            join_result = self.game.add_player(player_id, username)
+            join_result = self.matchmaker.join(player_id, username)
             if join_result.get("status") == "error":
                 return self.response(409, 'Conflict', {'error': join_result["message"]})
             
-            return self.response(200, 'OK', {'player_id': player_id, 'message': 'Welcome!'})
+            return self.response(200, 'OK', {'player_id': player_id, 'room_id': join_result["room_id"], 'message': 'Welcome!'})
 
         elif object_address == '/action':
             player_id = headers.get("X-Player-ID")
             if not player_id:
                 return self.response(401, 'Unauthorized', {'error': 'X-Player-ID header is required'})
 
-            if player_id not in self.game.players:
+            game = self.matchmaker.room_for(player_id)
+            if game is None:
+                if self.matchmaker.is_queued(player_id):
+                    return self.response(200, 'OK', {
+                        'status': 'Action rejected',
+                        'accepted': False,
+                        'message': 'Still waiting for a table.',
+                        'state': self.matchmaker.get_state(player_id),
+                    })
                 return self.response(404, 'Not Found', {'error': 'Player not found in game.'})
                 
-            self.game.handle_action(player_id, payload)
-            return self.response(200, 'OK', {'status': 'Action received'})
+            action_result = game.handle_action(player_id, payload)
+            accepted = action_result.get("status") == "ok"
+            body = {
+                'status': 'Action received' if accepted else 'Action rejected',
+                'accepted': accepted,
+                'state': action_result["state"],
+            }
+            if not accepted:
+                body['message'] = action_result["message"]
+            return self.response(200, 'OK', body)
+
+        elif object_address == '/batch':
+            return self.http_post_batch(headers, payload)
 
         elif object_address == '/disconnect':
             player_id = headers.get("X-Player-ID")
             if not player_id:
                  return self.response(401, 'Unauthorized', {'error': 'X-Player-ID header is required'})
-            self.game.remove_player(player_id)
+            self.matchmaker.leave(player_id)
             return self.response(200, 'OK', {'status': f'Player {player_id} disconnected'})
             
         else:
@@ -0,0 +1,197 @@
+import random
+import threading
+from collections import deque
+
+MAX_LEVELS = 32
+APPLIED_SEQS = 4096
+
+class _Node:
+    __slots__ = ("value", "next", "width")
+
+    def __init__(self, value, levels):
+        self.value = value
+        self.next = [None] * levels
+        self.width = [1] * levels
+
+_NIL = _Node(None, 0)
+
+class IndexableSkipList:
+    """Sorted list with O(log n) insert, remove, index and rank lookups.
+
+    Every forward link also stores how many positions it skips, which is
+    what makes positional lookups logarithmic.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.head = _Node(None, MAX_LEVELS)
+        self.head.next = [_NIL] * MAX_LEVELS
+
+    def __len__(self):
+        return self.size
+
+    def _find_chain(self, value):
+        chain = [None] * MAX_LEVELS
+        steps_at_level = [0] * MAX_LEVELS
+        node = self.head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level] is not _NIL and node.next[level].value < value:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        return chain, steps_at_level
+
+    def insert(self, value):
+        chain, steps_at_level = self._find_chain(value)
+        levels = 1
+        while levels < MAX_LEVELS and random.random() < 0.5:
+            levels += 1
+        new_node = _Node(value, levels)
+        steps = 0
+        for level in range(levels):
+            prev_node = chain[level]
+            new_node.next[level] = prev_node.next[level]
+            prev_node.next[level] = new_node
+            new_node.width[level] = prev_node.width[level] - steps
+            prev_node.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, MAX_LEVELS):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, value):
+        chain, _ = self._find_chain(value)
+        target = chain[0].next[0]
+        if target is _NIL or target.value != value:
+            raise KeyError(value)
+        for level in range(len(target.next)):
+            prev_node = chain[level]
+            prev_node.width[level] += target.width[level] - 1
+            prev_node.next[level] = target.next[level]
+        for level in range(len(target.next), MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def rank(self, value):
+        """Returns the 0-based position of ``value``."""
+        _, steps_at_level = self._find_chain(value)
+        return sum(steps_at_level)
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        node = self.head
+        remaining = index + 1
+        for level in reversed(range(MAX_LEVELS)):
+            while node.width[level] <= remaining and node.next[level] is not _NIL:
+                remaining -= node.width[level]
+                node = node.next[level]
+            if remaining == 0:
+                break
+        return node.value
+
+    def first(self, count):
+        values = []
+        node = self.head.next[0]
+        while node is not _NIL and len(values) < count:
+            values.append(node.value)
+            node = node.next[0]
+        return values
+
+
+class Leaderboard:
+    """Global ranking by score and by win rate, updated as guesses resolve.
+
+    Players are identified by username across rooms. Each update removes and
+    re-inserts the player's key in two skip lists, so updates, top-K and rank
+    queries never look at rooms or at the whole player set.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.players = {}
+        self.by_score = IndexableSkipList()
+        self.by_win_rate = IndexableSkipList()
+        # Event-log seqs of recent round_over events, so replaying the log never counts one twice
+        self.applied_seqs = deque(maxlen=APPLIED_SEQS)
+        self.applied_seq_set = set()
+
+    @staticmethod
+    def _win_rate(stats):
+        return stats["wins"] / stats["rounds"] if stats["rounds"] else 0.0
+
+    def _score_key(self, username, stats):
+        return (-stats["score"], -self._win_rate(stats), username)
+
+    def _win_rate_key(self, username, stats):
+        return (-self._win_rate(stats), -stats["rounds"], username)
+
+    def record_guess(self, username, won, seq=None):
+        with self.lock:
+            if seq is not None:
+                if seq in self.applied_seq_set:
+                    return
+                self._remember_seq(seq)
+            stats = self.players.get(username)
+            if stats is None:
+                stats = self.players[username] = {"score": 0, "wins": 0, "rounds": 0}
+            else:
+                self.by_score.remove(self._score_key(username, stats))
+                self.by_win_rate.remove(self._win_rate_key(username, stats))
+            stats["rounds"] += 1
+            if won:
+                stats["wins"] += 1
+                stats["score"] += 1
+            self.by_score.insert(self._score_key(username, stats))
+            self.by_win_rate.insert(self._win_rate_key(username, stats))
+
+    def _entry(self, username, stats, rank):
+        return {
+            "rank": rank,
+            "username": username,
+            "score": stats["score"],
+            "wins": stats["wins"],
+            "rounds": stats["rounds"],
+            "win_rate": round(self._win_rate(stats), 4),
+        }
+
+    def top(self, count, by="score"):
+        ranking = self.by_win_rate if by == "win_rate" else self.by_score
+        with self.lock:
+            keys = ranking.first(count)
+            return [self._entry(key[-1], self.players[key[-1]], i + 1) for i, key in enumerate(keys)]
+
+    def player_rank(self, username):
+        with self.lock:
+            stats = self.players.get(username)
+            if stats is None:
+                return None
+            entry = self._entry(username, stats, self.by_score.rank(self._score_key(username, stats)) + 1)
+            entry["win_rate_rank"] = self.by_win_rate.rank(self._win_rate_key(username, stats)) + 1
+            return entry
+
+    def _remember_seq(self, seq):
+        if len(self.applied_seqs) == self.applied_seqs.maxlen:
+            self.applied_seq_set.discard(self.applied_seqs[0])
+        self.applied_seqs.append(seq)
+        self.applied_seq_set.add(seq)
+
+    def snapshot(self, since_seq=0):
+        """Player stats plus the applied round_over seqs after ``since_seq``, which replay must skip."""
+        with self.lock:
+            return {
+                "players": {username: dict(stats) for username, stats in self.players.items()},
+                "applied_seqs": [seq for seq in self.applied_seqs if seq > since_seq],
+            }
+
+    def restore(self, snapshot):
+        with self.lock:
+            for seq in snapshot.get("applied_seqs", []):
+                self._remember_seq(seq)
+            for username, stats in snapshot["players"].items():
+                self.players[username] = dict(stats)
+                self.by_score.insert(self._score_key(username, stats))
+                self.by_win_rate.insert(self._win_rate_key(username, stats))
+
+    def __len__(self):
+        return len(self.players)
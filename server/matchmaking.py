@@ -0,0 +1,276 @@
+import heapq
+import threading
+import time
+import uuid
+import logging
+from collections import deque
+
+class _Bucket:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Queue order; an entry that is no longer the one in ``entries`` left the queue and is skipped
+        self.queue = deque()
+        # player_id -> that player's live queue entry
+        self.entries = {}
+        # (free seats, room_id) for rooms waiting for players; stale entries are skipped on pop
+        self.open_rooms = []
+        # Bumped on every queue change; the version of the MATCHMAKING placeholder state
+        self.version = 0
+
+    def append(self, entry):
+        self.queue.append(entry)
+        self.entries[entry[0]] = entry
+
+    def appendleft(self, entry):
+        self.queue.appendleft(entry)
+        self.entries[entry[0]] = entry
+
+    def head(self):
+        """The oldest live entry, or None; drops the cancelled entries in front of it."""
+        while self.queue:
+            entry = self.queue[0]
+            if self.entries.get(entry[0]) is entry:
+                return entry
+            self.queue.popleft()
+        return None
+
+    def popleft(self):
+        entry = self.head()
+        if entry is not None:
+            self.queue.popleft()
+            del self.entries[entry[0]]
+        return entry
+
+    def cancel(self, player_id):
+        """Takes ``player_id`` out of the queue in O(1) and returns its entry, or None if it was not queued."""
+        entry = self.entries.pop(player_id, None)
+        # Cancelled entries normally go as they reach the front; rebuild once they outnumber the live ones
+        if entry is not None and len(self.queue) > 2 * len(self.entries) + 16:
+            self.queue = deque(e for e in self.queue if self.entries.get(e[0]) is e)
+        return entry
+
+    def __len__(self):
+        return len(self.entries)
+
+class Matchmaker:
+    """Queues connecting players and seats them in rooms of ``required_players``.
+
+    Players first fill rooms that lost someone (fullest room first), otherwise
+    they wait in their bucket's queue until a whole room's worth is ready and a
+    new room is created for the batch. Each skill bucket has its own lock, so a
+    burst of joins only contends per bucket; seating costs a deque append and
+    heap operations, and leaving the queue only marks the entry cancelled.
+    """
+
+    def __init__(self, create_room, required_players, rooms, skill_of=None, bucket_size=None):
+        self.create_room = create_room
+        self.required_players = required_players
+        self.rooms = rooms
+        self.skill_of = skill_of
+        self.bucket_size = bucket_size
+        self.buckets = {}
+        self.buckets_lock = threading.Lock()
+        self.player_rooms = {}
+        self.player_buckets = {}
+        self.room_buckets = {}
+        self.usernames = {}
+        self.usernames_lock = threading.Lock()
+        # Set while the server hands off; queue_snapshot must see the final queues
+        self.frozen = False
+
+    def _bucket_key(self, username):
+        if not self.bucket_size or not self.skill_of:
+            return 0
+        return self.skill_of(username) // self.bucket_size
+
+    def _bucket(self, key):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            with self.buckets_lock:
+                bucket = self.buckets.setdefault(key, _Bucket())
+        return bucket
+
+    def restore(self):
+        """Registers players and open seats of rooms rebuilt from a snapshot or event log."""
+        for room_id, game in list(self.rooms.items()):
+            if not game.players:
+                del self.rooms[room_id]
+                continue
+            usernames = list(game.player_usernames.values())
+            key = self._bucket_key(usernames[0]) if usernames else 0
+            self.room_buckets[room_id] = key
+            for player_id in game.players:
+                self.player_rooms[player_id] = room_id
+                self.player_buckets[player_id] = key
+                username = game.player_usernames.get(player_id)
+                if username:
+                    self.usernames[username] = player_id
+            self._push_open_room(self._bucket(key), room_id)
+
+    def queue_snapshot(self):
+        """Returns the queued players per bucket, for handing them to another process."""
+        queues = {}
+        for key, bucket in list(self.buckets.items()):
+            with bucket.lock:
+                if bucket:
+                    queues[str(key)] = [[entry[0], entry[1]] for entry in bucket.queue
+                                        if bucket.entries.get(entry[0]) is entry]
+        return queues
+
+    def restore_queues(self, queues):
+        for key, entries in queues.items():
+            bucket = self._bucket(int(key))
+            with bucket.lock:
+                for player_id, username in entries:
+                    self.usernames[username] = player_id
+                    self.player_buckets[player_id] = int(key)
+                    self.player_rooms[player_id] = None
+                    bucket.append((player_id, username, time.monotonic()))
+                bucket.version += 1
+
+    def freeze(self, frozen=True):
+        """Refuses (or again accepts) joins and leaves; waits for the queue changes in progress."""
+        self.frozen = frozen
+        for bucket in list(self.buckets.values()):
+            with bucket.lock:
+                pass
+
+    def join(self, player_id, username, bucket_key=None):
+        with self.usernames_lock:
+            if username in self.usernames:
+                return {"status": "error", "message": "Username is already taken."}
+            self.usernames[username] = player_id
+
+        key = self._bucket_key(username) if bucket_key is None else bucket_key
+        bucket = self._bucket(key)
+        with bucket.lock:
+            if self.frozen:
+                with self.usernames_lock:
+                    del self.usernames[username]
+                return {"status": "error", "message": "The server is restarting. Try again in a moment."}
+            self.player_buckets[player_id] = key
+            self.player_rooms[player_id] = None
+            bucket.append((player_id, username, time.monotonic()))
+            self._fill_open_rooms(bucket)
+            if len(bucket) >= self.required_players:
+                self._start_room(bucket, key)
+            bucket.version += 1
+
+        room_id = self.player_rooms.get(player_id)
+        logging.info(f"Matchmaking: {username} ({player_id}) " + (f"seated in {room_id}" if room_id else "queued"))
+        return {"status": "ok", "room_id": room_id}
+
+    def _push_open_room(self, bucket, room_id):
+        game = self.rooms.get(room_id)
+        if game is None:
+            return
+        free_seats = self.required_players - len(game.players)
+        if free_seats > 0 and game.round_state == "WAITING_FOR_PLAYERS":
+            heapq.heappush(bucket.open_rooms, (free_seats, room_id))
+
+    def _fill_open_rooms(self, bucket):
+        while bucket and bucket.open_rooms:
+            free_seats, room_id = heapq.heappop(bucket.open_rooms)
+            game = self.rooms.get(room_id)
+            if game is None or self.required_players - len(game.players) != free_seats:
+                continue  # Stale entry, the room changed since it was pushed
+            entry = bucket.popleft()
+            player_id, username = entry[:2]
+            if game.add_player(player_id, username).get("status") != "ok":
+                bucket.appendleft(entry)
+                continue
+            self.player_rooms[player_id] = room_id
+            self._push_open_room(bucket, room_id)
+
+    def _start_room(self, bucket, key):
+        room_id = f"room_{uuid.uuid4().hex[:6]}"
+        game = self.create_room(room_id)
+        self.rooms[room_id] = game
+        self.room_buckets[room_id] = key
+        refused = []
+        for _ in range(self.required_players):
+            entry = bucket.popleft()
+            if game.add_player(*entry[:2]).get("status") != "ok":
+                refused.append(entry)
+                continue
+            self.player_rooms[entry[0]] = room_id
+        for entry in reversed(refused):
+            bucket.appendleft(entry)
+        if not game.players:
+            del self.rooms[room_id]
+            self.room_buckets.pop(room_id, None)
+            return
+        if refused:
+            self._push_open_room(bucket, room_id)
+        logging.info(f"Matchmaking: created {room_id} with {self.required_players} player(s)")
+
+    def leave(self, player_id):
+        if player_id not in self.player_rooms:
+            return False
+        bucket = self._bucket(self.player_buckets.get(player_id, 0))
+        with bucket.lock:
+            if self.frozen:
+                return False
+            room_id = self.player_rooms.pop(player_id, None)
+            self.player_buckets.pop(player_id, None)
+            game = self.rooms.get(room_id) if room_id else None
+            if game is None:
+                entry = bucket.cancel(player_id)
+                username = entry[1] if entry else None
+                bucket.version += 1
+            else:
+                username = game.player_usernames.get(player_id)
+                game.remove_player(player_id)
+                if not game.players:
+                    del self.rooms[room_id]
+                    self.room_buckets.pop(room_id, None)
+                else:
+                    self._push_open_room(bucket, room_id)
+                    self._fill_open_rooms(bucket)
+                    bucket.version += 1
+
+        with self.usernames_lock:
+            if username and self.usernames.get(username) == player_id:
+                del self.usernames[username]
+        return True
+
+    def stale_queues(self, max_wait):
+        """Returns ``{bucket_key: missing players}`` for queues whose oldest player waited over ``max_wait`` seconds."""
+        now = time.monotonic()
+        stale = {}
+        for key, bucket in list(self.buckets.items()):
+            with bucket.lock:
+                head = bucket.head()
+                if head is not None and now - head[2] > max_wait:
+                    stale[key] = self.required_players - len(bucket)
+        return stale
+
+    def is_queued(self, player_id):
+        return player_id in self.player_rooms and self.player_rooms[player_id] is None
+
+    def room_for(self, player_id):
+        room_id = self.player_rooms.get(player_id)
+        return self.rooms.get(room_id) if room_id else None
+
+    def get_state(self, player_id):
+        """Returns the player's room state, a matchmaking placeholder while queued, or None if unknown."""
+        game = self.room_for(player_id)
+        if game is not None:
+            return game.get_state()
+        if not self.is_queued(player_id):
+            return None
+        bucket = self._bucket(self.player_buckets.get(player_id, 0))
+        waiting = len(bucket)
+        return {
+            "version": bucket.version,
+            "room_id": None,
+            "current_round": 0,
+            "round_state": "MATCHMAKING",
+            "round_message": f"Finding a table... {waiting}/{self.required_players} players ready.",
+            "players": {},
+            "actual_total": None,
+            "required_players": self.required_players,
+            "active_player_id": None,
+            "player_usernames": {},
+            "turn_order": [],
+        }
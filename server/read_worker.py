@@ -0,0 +1,74 @@
+import json
+import socket
+import logging
+from http import HttpServer
+from state_plane import StatePlane
+from tracing import tracer
+from compression import encode_body
+
+class StatePlaneHttpServer(HttpServer):
+    """Answers ``GET /gamestate`` from the shared state plane, nothing else.
+
+    Runs inside read worker processes, which never see the rooms themselves;
+    clients name their room with the ``X-Room-ID`` header and, as on the main
+    port, only get it if their ``X-Player-ID`` is seated in the published state.
+    """
+
+    def __init__(self, state_plane):
+        super().__init__(None)
+        self.state_plane = state_plane
+        # room_id -> (version, player ids, {encoding: (body, content_encoding)}), so a version is parsed
+        # and compressed once
+        self.encoded_bodies = {}
+
+    def http_get(self, object_address, headers):
+        if object_address.split('?', 1)[0] != '/gamestate':
+            return self.response(404, 'Not Found', {'error': f'Endpoint {object_address} not found'})
+        player_id = headers.get("X-Player-ID")
+        if not player_id:
+            return self.response(400, 'Bad Request', {'error': 'X-Player-ID header is required'})
+        room_id = headers.get("X-Room-ID")
+        if not room_id:
+            return self.response(400, 'Bad Request', {'error': 'X-Room-ID header is required'})
+
+        published = self.state_plane.read(room_id)
+        if published is None:
+            return self.response(404, 'Not Found', {'error': f'Room {room_id} is not published'})
+        version, payload = published
+        encoding = self.request_local.encoding
+        cached_version, members, bodies = self.encoded_bodies.get(room_id, (None, None, {}))
+        if cached_version != version:
+            if len(self.encoded_bodies) >= self.state_plane.max_rooms:
+                # Rooms come and go; dropping everything now and then keeps this bounded
+                self.encoded_bodies.clear()
+            members = frozenset(json.loads(payload).get("players", ()))
+            bodies = {}
+            self.encoded_bodies[room_id] = (version, members, bodies)
+        if player_id not in members:
+            return self.response(404, 'Not Found', {'error': 'Player not found in game.'})
+        if encoding not in bodies:
+            bodies[encoding] = encode_body(payload, encoding)
+        return self.encoded_response(*bodies[encoding], headers={'X-State-Version': version})
+
+    def http_post(self, object_address, headers, body_str):
+        return self.response(405, 'Method Not Allowed', {'error': 'Read workers only serve GET /gamestate'})
+
+
+def serve(plane_name, port, client_handler):
+    """Entry point of a read worker process; ``client_handler`` is the server's ProcessTheClient."""
+    # Traces recorded here could never be read through /debug/traces on the main port
+    tracer.enabled = False
+    state_plane = StatePlane(name=plane_name)
+    http_server = StatePlaneHttpServer(state_plane)
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # Every worker binds the same port and the kernel spreads connections across them
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    listener.bind(('0.0.0.0', port))
+    listener.listen(128)
+    logging.info(f"Read worker listening on port {port}")
+
+    while True:
+        connection, client_address = listener.accept()
+        connection.settimeout(15.0)
+        client_handler(connection, client_address, http_server).start()
@@ -1,12 +1,28 @@
+import os
+import argparse
+import tempfile
 import socket
 import threading
 import logging
 import time
+import multiprocessing
 from http import HttpServer
-from game_logic import NumberGuessGame
+from game_logic import NumberGuessGame, is_bot
+from event_log import EventLog, EventLogError
+from history_store import HistoryStore
+from leaderboard import Leaderboard
+from matchmaking import Matchmaker
+from state_plane import StatePlane
+import read_worker
+from handoff import HandoffListener, send_handoff, request_takeover
+from tracing import tracer
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+LISTEN_BACKLOG = 128
+# Upper bound on waiting for in-flight requests before a handoff, not per connection
+HANDOFF_DRAIN_SECONDS = 5.0
+
 class ProcessTheClient(threading.Thread):
     def __init__(self, connection, address, http_server):
         self.connection = connection
@@ -15,6 +31,14 @@ class ProcessTheClient(threading.Thread):
         threading.Thread.__init__(self)
 
     def run(self):
+        trace = tracer.begin()
+        try:
+            self.handle_request(trace)
+        finally:
+            tracer.end(trace)
+
+    def handle_request(self, trace):
+        recv_started = time.perf_counter()
         header_buffer = b""
         while b'\r\n\r\n' not in header_buffer:
             try:
@@ -26,6 +50,11 @@ class ProcessTheClient(threading.Thread):
                 logging.warning(f"Connection timed out or was reset by {self.address}. Partial data received: {header_buffer!r}")
                 break
         
+        if not header_buffer:
+            # Closed without a byte, like the wake-up connection that unblocks accept(); not a bad request
+            logging.debug(f"Empty connection from {self.address}")
+            self.connection.close()
+            return
         if b'\r\n\r\n' not in header_buffer:
             logging.warning(f"Incomplete headers received from {self.address}. Discarding request.")
             self.connection.close()
@@ -59,30 +88,209 @@ class ProcessTheClient(threading.Thread):
                 body_part += data
             except (socket.timeout, ConnectionResetError):
                 break
+        if trace:
+            trace.add("recv", time.perf_counter() - recv_started)
 
         full_request = headers + '\r\n\r\n' + body_part.decode('utf-8', 'ignore')
         
         logging.info(f"Processing request from {self.address}: {full_request.strip()}")
         hasil = self.http_server.proses(full_request)
-        
-        self.connection.sendall(hasil)
+        if trace:
+            trace.tags["status"] = int(hasil[9:12])
+
+        with tracer.span("send"):
+            self.connection.sendall(hasil)
         self.connection.close()
 
 class Server(threading.Thread):
-    def __init__(self, port=8000, required_players=2):
+    def __init__(self, port=8000, required_players=2, data_dir=None, skill_bucket_size=None, bots=False,
+                 read_workers=0, read_port=8001, handoff_path=None, takeover=False, admin_token=None):
         super().__init__()
         self.port = port
-        self.game = NumberGuessGame(required_players=required_players)
-        self.http_server = HttpServer(self.game)
-        self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.handoff_path = handoff_path
+        self.handoff_listener = None
+        self.takeover_conn = None
+        self.handed_off = False
+        self.client_threads = []
+        # When taking over, block until the old process has drained and passed its socket and rooms
+        self.inherited_socket, handoff_snapshot = request_takeover(handoff_path) if takeover else (None, None)
+        self.required_players = required_players
+        self.read_port = read_port
+        self.state_plane = StatePlane() if read_workers else None
+        self.read_processes = []
+        self.leaderboard = Leaderboard()
+        self.event_log = EventLog(data_dir, leaderboard=self.leaderboard) if data_dir else None
+        self.history = HistoryStore(os.path.join(data_dir, "rounds.dat")) if data_dir else None
+        if handoff_snapshot:
+            self.leaderboard.restore(handoff_snapshot["leaderboard"])
+            self.rooms = self.restore_handoff(handoff_snapshot)
+        else:
+            self.rooms = self.restore_rooms() if self.event_log else {}
+        self.matchmaker = Matchmaker(self.create_room, required_players, self.rooms,
+                                     skill_of=self.player_skill, bucket_size=skill_bucket_size)
+        self.matchmaker.restore()
+        if handoff_snapshot:
+            self.matchmaker.restore_queues(handoff_snapshot["queues"])
+        if self.state_plane:
+            for game in self.rooms.values():
+                game.state_plane = self.state_plane
+                game.publish_state()
+            self.start_read_workers(read_workers)
+        self.bot_manager = None
+        if bots:
+            self.start_bots(handoff_snapshot["bots"] if handoff_snapshot else ())
+        if self.event_log:
+            self.event_log.open(snapshot_source=lambda: self.rooms)
+        self.http_server = HttpServer(self.matchmaker, history=self.history, leaderboard=self.leaderboard,
+                                      admin_token=admin_token)
+        if self.inherited_socket:
+            self.my_socket = self.inherited_socket
+        else:
+            self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.running = True
         
+    def create_room(self, room_id):
+        game = NumberGuessGame(required_players=self.required_players, room_id=room_id,
+                               event_log=self.event_log, history=self.history, leaderboard=self.leaderboard)
+        game.state_plane = self.state_plane
+        return game
+
+    def start_bots(self, bot_ids=()):
+        try:
+            from bots import BotManager
+        except ImportError as e:
+            logging.warning(f"Bot players are disabled, NumPy is required: {e}")
+            return
+        self.bot_manager = BotManager(self.matchmaker)
+        self.bot_manager.bots.update(bot_ids)
+        self.bot_manager.start()
+
+    def start_read_workers(self, count):
+        """Forks processes that answer /gamestate polls on read_port straight from the state plane."""
+        context = multiprocessing.get_context("fork")
+        for _ in range(count):
+            process = context.Process(target=read_worker.serve,
+                                      args=(self.state_plane.name, self.read_port, ProcessTheClient), daemon=True)
+            process.start()
+            self.read_processes.append(process)
+        logging.info(f"Started {count} read worker(s) on port {self.read_port}")
+
+    def player_skill(self, username):
+        entry = self.leaderboard.player_rank(username)
+        return entry["score"] if entry else 0
+
+    def restore_rooms(self):
+        """Rebuilds rooms from the latest snapshot plus the events logged after it."""
+        snapshots, events, leaderboard = self.event_log.recover()
+        if leaderboard:
+            self.leaderboard.restore(leaderboard)
+        rooms = {room_id: NumberGuessGame.from_snapshot(snapshot, event_log=self.event_log, history=self.history,
+                                                         leaderboard=self.leaderboard)
+                 for room_id, snapshot in snapshots.items()}
+        for seq, room_id, event_type, data in events:
+            if (event_type == "round_over" and seq > self.event_log.snapshot_seq and data.get("username")
+                    and not is_bot(data["player_id"])):
+                # The leaderboard snapshot covers everything up to its seq plus the applied seqs it lists
+                self.leaderboard.record_guess(data["username"], data["winner"] is not None, seq=seq)
+            game = rooms.get(room_id)
+            if game is None:
+                game = rooms[room_id] = self.create_room(room_id)
+            if seq <= game.last_event_seq:
+                continue  # Already part of the snapshot
+            game.apply_event(event_type, data)
+            game.last_event_seq = seq
+        for room_id, game in rooms.items():
+            logging.info(f"Restored room {room_id}: round {game.current_round}, {len(game.players)} player(s), {game.round_state}")
+        return rooms
+
+    def restore_handoff(self, snapshot):
+        """Rebuilds rooms from the snapshot a previous process handed over."""
+        if self.event_log:
+            # The old process closed the log with the same snapshot; recovering only restores the sequence
+            self.event_log.recover()
+        rooms = {room_id: NumberGuessGame.from_snapshot(room, event_log=self.event_log, history=self.history,
+                                                         leaderboard=self.leaderboard)
+                 for room_id, room in snapshot["rooms"].items()}
+        logging.info(f"Took over {len(rooms)} room(s) from the previous server process")
+        return rooms
+
+    def snapshot(self):
+        return {
+            "rooms": {room_id: game.to_snapshot() for room_id, game in list(self.rooms.items())},
+            "queues": self.matchmaker.queue_snapshot(),
+            "bots": sorted(self.bot_manager.bots) if self.bot_manager else [],
+            "leaderboard": self.leaderboard.snapshot(),
+        }
+
+    def request_handoff(self, conn):
+        """Called by the handoff listener: stop accepting and let run() finish the handoff."""
+        self.takeover_conn = conn
+        self.running = False
+        self._unblock_accept()
+
+    def hand_off(self, conn):
+        """Passes the socket and state to the new process; returns False if this process keeps serving."""
+        # Connections arriving meanwhile wait in the listen backlog for whichever process accepts next
+        deadline = time.monotonic() + HANDOFF_DRAIN_SECONDS
+        for client_thread in self.client_threads:
+            client_thread.join(timeout=max(deadline - time.monotonic(), 0))
+        still_running = sum(t.is_alive() for t in self.client_threads)
+        if still_running:
+            logging.warning(f"Handing off with {still_running} connection(s) still in flight")
+        if self.bot_manager:
+            self.bot_manager.stop()
+            self.bot_manager.join(timeout=5.0)
+
+        # Requests still in flight get an error instead of changing state the snapshot no longer covers
+        self.matchmaker.freeze()
+        for game in list(self.rooms.values()):
+            game.freeze()
+        snapshot = self.snapshot()
+        # Make everything durable but keep the files open until the new process confirms
+        if self.event_log:
+            try:
+                self.event_log.checkpoint(self.rooms)
+            except EventLogError as e:
+                logging.warning(f"Handing off without a final checkpoint: {e}")
+        if self.history:
+            self.history.flush()
+        if not send_handoff(conn, self.my_socket, snapshot):
+            logging.warning("The new process did not confirm the takeover, resuming service.")
+            self.matchmaker.freeze(False)
+            for game in list(self.rooms.values()):
+                game.freeze(False)
+            if self.bot_manager:
+                self.start_bots(self.bot_manager.bots)
+            return False
+
+        if self.event_log:
+            self.event_log.close()
+        if self.history:
+            self.history.close()
+        self.my_socket.close()
+        self.stop_read_workers()
+        self.handed_off = True
+        logging.info("Handoff complete, this process is done.")
+        return True
+
     def run(self):
-        self.my_socket.bind(('0.0.0.0', self.port))
-        self.my_socket.listen(5)
+        if not self.inherited_socket:
+            self.my_socket.bind(('0.0.0.0', self.port))
+            self.my_socket.listen(LISTEN_BACKLOG)
         logging.info(f"Server is listening on port {self.port}")
 
+        while True:
+            if self.handoff_path:
+                self.handoff_listener = HandoffListener(self.handoff_path, self.request_handoff)
+                self.handoff_listener.start()
+            self.accept_connections()
+            if not self.takeover_conn or self.hand_off(self.takeover_conn):
+                break
+            self.takeover_conn = None
+            self.running = True
+
+    def accept_connections(self):
         while self.running:
             try:
                 connection, client_address = self.my_socket.accept()
@@ -91,14 +299,14 @@ class Server(threading.Thread):
                 connection.settimeout(15.0)
                 clt = ProcessTheClient(connection, client_address, self.http_server)
                 clt.start()
+                self.client_threads = [t for t in self.client_threads if t.is_alive()]
+                self.client_threads.append(clt)
             except socket.error:
                 if self.running:
                     logging.info("Server socket closed.")
                 break
 
-    def shutdown(self):
-        self.running = False
-        # To unblock the accept() call
+    def _unblock_accept(self):
         try:
             # Create a dummy connection to the server to unblock the accept call
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -106,19 +314,55 @@ class Server(threading.Thread):
         except Exception as e:
             logging.debug(f"Dummy connection during shutdown failed: {e}")
 
+    def stop_read_workers(self):
+        for process in self.read_processes:
+            process.terminate()
+            process.join(timeout=1.0)
+        if self.state_plane:
+            self.state_plane.close()
+
+    def shutdown(self):
+        if self.handed_off:
+            return
+        self.running = False
+        # To unblock the accept() call
+        self._unblock_accept()
+
         self.my_socket.close()
+        if self.handoff_listener:
+            self.handoff_listener.close()
+        if self.bot_manager:
+            self.bot_manager.stop()
+        self.stop_read_workers()
+        if self.event_log:
+            self.event_log.close(self.rooms)
+        if self.history:
+            self.history.close()
         logging.info("Server has been shut down.")
 
 
 def main():
     """Initializes and starts the server."""
+    parser = argparse.ArgumentParser(description="Number Guess Game server")
+    parser.add_argument("--takeover", action="store_true",
+                        help="take the listening socket and rooms over from the running server (zero-downtime upgrade)")
+    args = parser.parse_args()
+
     server_port = 8000
-    server_instance = Server(port=server_port, required_players=2)
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+    handoff_path = os.path.join(tempfile.gettempdir(), f"jempol-{server_port}.sock")
+    # Tracing starts off unless JEMPOL_TRACING=1; it can be toggled later through POST /debug/traces
+    tracer.enabled = os.environ.get("JEMPOL_TRACING") == "1"
+    server_instance = Server(port=server_port, required_players=2, data_dir=data_dir, bots=True,
+                             read_workers=2, read_port=server_port + 1,
+                             handoff_path=handoff_path, takeover=args.takeover,
+                             admin_token=os.environ.get("JEMPOL_ADMIN_TOKEN"))
     server_instance.daemon = True
     server_instance.start()
 
     try:
-        while True:
+        # Returns once the server stops, including after handing off to a new process
+        while server_instance.is_alive():
             time.sleep(1)
     except KeyboardInterrupt:
         print("\nShutdown signal received.")
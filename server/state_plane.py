@@ -0,0 +1,192 @@
+import zlib
+import struct
+import threading
+from multiprocessing import shared_memory
+
+MAGIC = b"JPSTATE1"
+# magic, slot count, ring depth, buffer size
+PLANE_HEADER = struct.Struct("<8sIII")
+# seqlock counter, room_id, index of the newest buffer, slot state
+SLOT_HEADER = struct.Struct("<Q32sII")
+# A lookup stops at a never-used slot; a released slot is a tombstone it has to probe past
+SLOT_EMPTY, SLOT_USED, SLOT_RELEASED = 0, 1, 2
+# seqlock counter, state version, payload length
+BUFFER_HEADER = struct.Struct("<QQI4x")
+MAX_READ_RETRIES = 100
+
+class StatePlane:
+    """Serialized room states in shared memory, one writer and many reader processes.
+
+    Each room owns a slot holding a small ring of buffers. The owner writes a
+    new state into the buffer after the newest one and then flips the slot's
+    head index, so readers normally copy a buffer nobody is writing. Both the
+    slot header and every buffer carry a seqlock counter (odd while being
+    written), and readers retry whenever the counter is odd or changed under
+    them; readers never take a lock or talk to the owner.
+
+    Slots form an open-addressing table: a room lives at the first free slot
+    from ``crc32(room_id)`` onwards, so a reader finds it, or learns that it
+    is not published, by probing from there instead of scanning every slot.
+
+    The owner creates the plane with ``StatePlane(max_rooms=...)``; readers
+    attach with ``StatePlane(name=owner.name)``.
+    """
+
+    def __init__(self, name=None, max_rooms=1024, ring_depth=2, buffer_size=16384):
+        if name is None:
+            self.max_rooms = max_rooms
+            self.ring_depth = ring_depth
+            self.buffer_size = buffer_size
+            self.shm = shared_memory.SharedMemory(create=True, size=self._total_size())
+            PLANE_HEADER.pack_into(self.shm.buf, 0, MAGIC, max_rooms, ring_depth, buffer_size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            magic, self.max_rooms, self.ring_depth, self.buffer_size = PLANE_HEADER.unpack_from(self.shm.buf, 0)
+            if magic != MAGIC:
+                raise ValueError(f"Shared memory {name} is not a state plane")
+            self.owner = False
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        self.lock = threading.Lock()
+        self.room_slots = {}
+
+    def _buffer_stride(self):
+        return BUFFER_HEADER.size + self.buffer_size
+
+    def _slot_size(self):
+        return SLOT_HEADER.size + self.ring_depth * self._buffer_stride()
+
+    def _total_size(self):
+        return PLANE_HEADER.size + self.max_rooms * self._slot_size()
+
+    def _slot_offset(self, slot):
+        return PLANE_HEADER.size + slot * self._slot_size()
+
+    def _buffer_offset(self, slot, index):
+        return self._slot_offset(slot) + SLOT_HEADER.size + index * self._buffer_stride()
+
+    def _home_slot(self, room_key):
+        return zlib.crc32(room_key) % self.max_rooms
+
+    def _slot_state(self, slot):
+        return SLOT_HEADER.unpack_from(self.buf, self._slot_offset(slot))[3]
+
+    def _write_slot_header(self, slot, room_key, head, state):
+        offset = self._slot_offset(slot)
+        seq = SLOT_HEADER.unpack_from(self.buf, offset)[0]
+        struct.pack_into("<Q", self.buf, offset, seq + 1)
+        SLOT_HEADER.pack_into(self.buf, offset, seq + 1, room_key, head, state)
+        struct.pack_into("<Q", self.buf, offset, seq + 2)
+
+    # --- Owner side ---
+
+    def publish(self, room_id, version, payload):
+        """Publishes ``payload`` as the room's newest state. Returns False if it does not fit."""
+        if len(payload) > self.buffer_size:
+            return False
+        with self.lock:
+            room_key = room_id.encode()[:32]
+            slot = self.room_slots.get(room_id)
+            if slot is None:
+                slot = self._claim_slot(room_key)
+                if slot is None:
+                    return False
+                self.room_slots[room_id] = slot
+                head = 0
+            else:
+                head = (SLOT_HEADER.unpack_from(self.buf, self._slot_offset(slot))[2] + 1) % self.ring_depth
+
+            offset = self._buffer_offset(slot, head)
+            seq = BUFFER_HEADER.unpack_from(self.buf, offset)[0]
+            struct.pack_into("<Q", self.buf, offset, seq + 1)
+            BUFFER_HEADER.pack_into(self.buf, offset, seq + 1, version, len(payload))
+            data_start = offset + BUFFER_HEADER.size
+            self.buf[data_start:data_start + len(payload)] = payload
+            struct.pack_into("<Q", self.buf, offset, seq + 2)
+
+            self._write_slot_header(slot, room_key, head, SLOT_USED)
+            return True
+
+    def _claim_slot(self, room_key):
+        if len(self.room_slots) >= self.max_rooms:
+            return None
+        home = self._home_slot(room_key)
+        for i in range(self.max_rooms):
+            slot = (home + i) % self.max_rooms
+            if self._slot_state(slot) != SLOT_USED:
+                return slot
+        return None
+
+    def release(self, room_id):
+        with self.lock:
+            slot = self.room_slots.pop(room_id, None)
+            if slot is None:
+                return
+            self._write_slot_header(slot, b"", 0, SLOT_RELEASED)
+            # Tombstones directly before a never-used slot end no probe chain, so they become empty again
+            if self._slot_state((slot + 1) % self.max_rooms) != SLOT_EMPTY:
+                return
+            for _ in range(self.max_rooms):
+                if self._slot_state(slot) != SLOT_RELEASED:
+                    break
+                self._write_slot_header(slot, b"", 0, SLOT_EMPTY)
+                slot = (slot - 1) % self.max_rooms
+
+    # --- Reader side ---
+
+    def _find_slot(self, room_key):
+        home = self._home_slot(room_key)
+        for i in range(self.max_rooms):
+            slot = (home + i) % self.max_rooms
+            offset = self._slot_offset(slot)
+            for _ in range(MAX_READ_RETRIES):
+                seq, slot_room, _, state = SLOT_HEADER.unpack_from(self.buf, offset)
+                if not seq & 1 and SLOT_HEADER.unpack_from(self.buf, offset)[0] == seq:
+                    break
+            if state == SLOT_EMPTY:
+                return None
+            if state == SLOT_USED and slot_room.rstrip(b"\0") == room_key:
+                return slot
+        return None
+
+    def read(self, room_id):
+        """Returns ``(version, payload)`` for the room's newest state, or None if it is not published."""
+        room_key = room_id.encode()[:32]
+        slot = self.room_slots.get(room_id)
+        if slot is None:
+            slot = self._find_slot(room_key)
+            if slot is None:
+                return None
+            self.room_slots[room_id] = slot
+
+        slot_offset = self._slot_offset(slot)
+        for _ in range(MAX_READ_RETRIES):
+            seq_before, slot_room, head, _ = SLOT_HEADER.unpack_from(self.buf, slot_offset)
+            if seq_before & 1 or SLOT_HEADER.unpack_from(self.buf, slot_offset)[0] != seq_before:
+                continue
+            if slot_room.rstrip(b"\0") != room_key:
+                # The room moved or was released since it was cached; the probe is short, so look it up again
+                self.room_slots.pop(room_id, None)
+                slot = self._find_slot(room_key)
+                if slot is None:
+                    return None
+                self.room_slots[room_id] = slot
+                slot_offset = self._slot_offset(slot)
+                continue
+
+            offset = self._buffer_offset(slot, head)
+            buffer_seq, version, length = BUFFER_HEADER.unpack_from(self.buf, offset)
+            if buffer_seq & 1:
+                continue
+            data_start = offset + BUFFER_HEADER.size
+            payload = bytes(self.buf[data_start:data_start + length])
+            if BUFFER_HEADER.unpack_from(self.buf, offset)[0] == buffer_seq:
+                return version, payload
+        return None
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
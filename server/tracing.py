@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+
+_NO_SPAN = nullcontext()
+
+class Trace:
+    """Timings of one request, accumulated per span name (recv, parse, lock_wait, logic, serialize, send)."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.started_perf = time.perf_counter()
+        self.spans = {}
+        self.tags = {}
+
+    def add(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    @contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    @contextmanager
+    def locked(self, lock):
+        started = time.perf_counter()
+        lock.acquire()
+        acquired = time.perf_counter()
+        self.add("lock_wait", acquired - started)
+        try:
+            yield
+        finally:
+            lock.release()
+            self.add("logic", time.perf_counter() - acquired)
+
+    def to_dict(self):
+        total = time.perf_counter() - self.started_perf
+        return {
+            "started": round(self.started, 6),
+            **self.tags,
+            "total_ms": round(total * 1000, 3),
+            "spans": {name: round(seconds * 1000, 3) for name, seconds in self.spans.items()},
+        }
+
+
+class Tracer:
+    """Keeps the last ``capacity`` request traces in a ring buffer.
+
+    Each request runs on its own thread, so the active trace lives in a
+    thread-local; code deeper in the stack calls ``tracer.span(...)`` or
+    ``tracer.locked(...)`` without having the trace passed in. While tracing
+    is disabled those return the plain lock or a shared no-op context, so the
+    hot path pays one attribute lookup.
+    """
+
+    def __init__(self, capacity=1024):
+        self.enabled = False
+        self.traces = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def begin(self):
+        if not self.enabled:
+            return None
+        trace = Trace()
+        self.local.trace = trace
+        return trace
+
+    def end(self, trace):
+        if trace is None:
+            return
+        self.local.trace = None
+        record = trace.to_dict()
+        with self.lock:
+            self.traces.append(record)
+
+    def current(self):
+        return getattr(self.local, "trace", None)
+
+    def annotate(self, **tags):
+        trace = self.current()
+        if trace is not None:
+            trace.tags.update(tags)
+
+    def span(self, name):
+        trace = self.current()
+        return _NO_SPAN if trace is None else trace.span(name)
+
+    def locked(self, lock):
+        trace = self.current()
+        return lock if trace is None else trace.locked(lock)
+
+    def recent(self, limit=100):
+        with self.lock:
+            traces = list(self.traces)
+        return traces[-limit:]
+
+
+class SamplingProfiler:
+    """Statistical profiler that samples every thread's stack with ``sys._current_frames``.
+
+    Nothing is hooked into the interpreter, so running it costs one stack walk
+    per thread per interval and stopping it leaves no trace. Results are in
+    the collapsed-stack format (``frame;frame;frame count``) that flame graph
+    tools read.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _frame_label(frame):
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def profile(self, seconds, interval=0.005):
+        """Samples for ``seconds``; returns None if another profile is already running."""
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            own_thread = threading.get_ident()
+            counts = Counter()
+            samples = 0
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(self._frame_label(frame))
+                        frame = frame.f_back
+                    counts[";".join(reversed(stack))] += 1
+                samples += 1
+                time.sleep(interval)
+        finally:
+            self.lock.release()
+        return {
+            "seconds": seconds,
+            "interval_ms": interval * 1000,
+            "samples": samples,
+            "stacks": [f"{stack} {count}" for stack, count in counts.most_common()],
+        }
+
+
+tracer = Tracer()
+profiler = SamplingProfiler()